@@ -1,10 +1,17 @@
 # Import the `make_layout` function from the `layout` module
 from views.layout import make_layout
 import trading_tool.configloader as cfg
+from trading_tool.client import CLIENT, TEST_CLIENT
+from trading_tool.tickers import get_ticker_service
 
 # Import the Dash app instance
 from maindash import app
 
+# Keep the prices of both clients fresh in the background, so that page loads
+# read them from memory instead of waiting for the API
+get_ticker_service(CLIENT).start()
+get_ticker_service(TEST_CLIENT).start()
+
 # Set the layout of the Dash app to the output of the `make_layout` function
 app.layout = make_layout()
 
@@ -0,0 +1,167 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+from binance.helpers import interval_to_milliseconds
+
+from trading_tool.client import CLIENT
+from trading_tool.db import (
+    KLINE_TABLES,
+    get_connection,
+    get_symbol_id,
+    to_db_datetime,
+    upsert_klines,
+)
+from trading_tool.downloader import KLINES_PAGE_WEIGHT, TokenBucket, request_with_retries
+from trading_tool.load import get_kline_page
+import trading_tool.configloader as cfg
+
+# Klines requested per page, the maximum allowed by the API
+PAGE_SIZE = 1000
+
+
+def to_ms(value):
+    # Milliseconds since the epoch of a naive UTC datetime or string
+    return pd.Timestamp(value).value // 10**6
+
+
+def get_checkpoint(conn, id_symbol, interval):
+    """
+    Get the backfill checkpoint of a symbol and interval
+    :param conn: Connection object
+    :param id_symbol: id of the symbol
+    :param interval: kline interval
+    :return: tuple (start, last kline written) as Timestamps, None if there is none
+    """
+
+    row = conn.execute(
+        """
+        SELECT startDateTime, lastDateTime
+        FROM backfill_checkpoints
+        WHERE id_symbol = ? AND interval = ?
+        """,
+        (id_symbol, interval),
+    ).fetchone()
+
+    return None if row is None else (pd.Timestamp(row[0]), pd.Timestamp(row[1]))
+
+
+def save_checkpoint(conn, id_symbol, interval, start_datetime, last_datetime):
+    # Record the start of the backfill and the last kline written
+    start, last = to_db_datetime([start_datetime, last_datetime])
+    conn.execute(
+        """
+        INSERT INTO backfill_checkpoints
+        (id_symbol, interval, startDateTime, lastDateTime, updated)
+        VALUES (?, ?, ?, ?, datetime('now'))
+        ON CONFLICT (id_symbol, interval) DO UPDATE SET
+            startDateTime = excluded.startDateTime,
+            lastDateTime = excluded.lastDateTime,
+            updated = excluded.updated
+        """,
+        (id_symbol, interval, str(start), str(last)),
+    )
+
+
+def backfill_symbol(
+    symbol, interval, start_datetime, end_datetime=None, client=CLIENT, bucket=None
+):
+    """
+    Download the klines of a symbol in pages of PAGE_SIZE bars and write every page
+    with its checkpoint in a single transaction, so only one page is held in memory
+    and an interrupted backfill resumes after the last page written
+    :param symbol: symbol to backfill
+    :param interval: kline interval, a key of KLINE_TABLES
+    :param start_datetime: start datetime (UTC)
+    :param end_datetime: end datetime (UTC) (default: None, now)
+    :param client: Binance API client
+    :param bucket: TokenBucket shared by all requests (default: a new one)
+    :return: number of rows inserted or updated
+    """
+
+    conn = get_connection(cfg.DB_FILENAME)
+    table_name = KLINE_TABLES[interval]
+    bucket = bucket or TokenBucket()
+
+    id_symbol = get_symbol_id(conn, symbol)
+    if id_symbol is None:
+        print(f"{symbol} is not in ddbb")
+        return 0
+
+    step = interval_to_milliseconds(interval)
+    start = pd.Timestamp(start_datetime)
+    cursor = to_ms(start)
+    end_ms = to_ms(end_datetime or datetime.utcnow())
+
+    # Resume after the last kline written if the checkpoint covers the start
+    checkpoint = get_checkpoint(conn, id_symbol, interval)
+    if checkpoint is not None and checkpoint[0] <= start <= checkpoint[1]:
+        start = checkpoint[0]
+        cursor = to_ms(checkpoint[1]) + step
+        print(f"Resuming {symbol} {interval} from {checkpoint[1]}")
+
+    n_rows = 0
+    while cursor <= end_ms:
+        df = request_with_retries(
+            bucket,
+            KLINES_PAGE_WEIGHT,
+            get_kline_page,
+            {
+                "client": client,
+                "symbol": symbol,
+                "interval": interval,
+                "start_ms": cursor,
+                "end_ms": end_ms,
+                "limit": PAGE_SIZE,
+            },
+        )
+        # Keep only closed bars; the backfill stops at the bar still open
+        df = df.loc[df["closeTime"] < datetime.utcnow()]
+        if df.shape[0] == 0:
+            break
+
+        # The checkpoint statement opens the transaction that upsert_klines commits,
+        # so a page and its checkpoint are written together or not at all
+        last_datetime = df["dateTime"].iloc[-1]
+        with conn:
+            save_checkpoint(conn, id_symbol, interval, start, last_datetime)
+            n_rows += upsert_klines(conn, table_name, id_symbol, df)
+        cursor = to_ms(last_datetime) + step
+        print(f"{symbol} {interval}: written up to {last_datetime} ({n_rows} rows)")
+
+    return n_rows
+
+
+def main(symbols=None, interval="1m", start="2022-01-01", end=None, workers=4, client=CLIENT):
+    # Backfill the symbols given or every symbol with USD in its name
+    if not symbols:
+        conn = get_connection(cfg.DB_FILENAME)
+        symbols = pd.read_sql("SELECT symbol FROM symbols WHERE symbol LIKE '%USD%'", conn)
+        symbols = symbols["symbol"].tolist()
+
+    # Every symbol runs on its own thread and connection, sharing the weight limit
+    bucket = TokenBucket()
+
+    def run(symbol):
+        try:
+            return backfill_symbol(symbol, interval, start, end, client, bucket)
+        except Exception as exc:
+            print(f"Backfill of {symbol} stopped, run again to resume: {exc}")
+            return 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        n_rows = sum(executor.map(run, symbols))
+
+    print(f"Backfill finished, {n_rows} rows written.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill klines with resumable checkpoints")
+    parser.add_argument("--symbols", nargs="+", default=None)
+    parser.add_argument("--interval", choices=list(KLINE_TABLES), default="1m")
+    parser.add_argument("--start", default="2022-01-01")
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    main(args.symbols, args.interval, args.start, args.end, args.workers)
@@ -0,0 +1,184 @@
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from trading_tool.strategy import (
+    BFSL,
+    DummyStrategy,
+    MovingAverageStrategy,
+    SimpleStrategy,
+    Strategy,
+    Wallet,
+)
+
+# Number of bars of each benchmark size
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000, "10M": 10_000_000}
+
+
+def make_synthetic_klines(n_bars, seed=0, start="2022-01-01", freq="1min"):
+    """
+    Generate deterministic 1-minute OHLC klines following a geometric random walk
+    :param n_bars: number of bars
+    :param seed: random seed, the same seed always gives the same klines
+    :param start: datetime of the first bar
+    :param freq: pandas frequency between bars
+    :return: DataFrame with the columns of get_kline plus ds and y, as used by strategies
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # Prices around 40000 with 0.1% volatility per bar
+    close = 40000 * np.exp(np.cumsum(rng.normal(0, 0.001, n_bars)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    wick = np.abs(rng.normal(0, 0.0005, (2, n_bars)))
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = rng.gamma(2.0, 5.0, n_bars)
+    date_time = pd.date_range(start, periods=n_bars, freq=freq)
+
+    df = pd.DataFrame(
+        {
+            "dateTime": date_time,
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume,
+            "closeTime": date_time + pd.Timedelta(freq) - pd.Timedelta(milliseconds=1),
+            "quoteAssetVolume": volume * close,
+            "numberOfTrades": rng.integers(1, 1000, n_bars),
+            "takerBuyBaseVol": volume / 2,
+            "takerBuyQuoteVol": volume * close / 2,
+        }
+    )
+    df["ds"] = df["dateTime"]
+    df["y"] = df["close"]
+
+    return df
+
+
+def make_wallet():
+    # Coin names are given so that no database lookup is needed
+    return Wallet(symbol="BTCUSDT", a=0.025, b=1000.0, a_name="BTC", b_name="USDT")
+
+
+def get_cases():
+    """
+    Benchmark cases. Each case has a setup function, run once per measurement and
+    not timed, and a run function that receives its output and is timed
+    """
+
+    def run_assess_operations(strategy):
+        Strategy.assess_operations(strategy)
+
+    def run_get_profitabilities(strategy):
+        # Drop cached metrics so that they are computed again
+        strategy.metrics = None
+        strategy.get_profitabilities()
+
+    def setup_strategy(df):
+        return SimpleStrategy(df=df.copy(), start_wallet=make_wallet(), alpha=0.15, delta=0.002)
+
+    cases = {
+        "DummyStrategy": (
+            lambda df: df.copy(),
+            lambda df: DummyStrategy(df=df, start_wallet=make_wallet()),
+        ),
+        "BFSL": (
+            lambda df: df.copy(),
+            lambda df: BFSL(df=df, start_wallet=make_wallet(), alpha=0.15),
+        ),
+        "SimpleStrategy": (
+            lambda df: df.copy(),
+            lambda df: SimpleStrategy(df=df, start_wallet=make_wallet(), alpha=0.15, delta=0.002),
+        ),
+        "MovingAverageStrategy": (
+            lambda df: df.copy(),
+            lambda df: MovingAverageStrategy(
+                df=df, start_wallet=make_wallet(), big_ma_window=100, small_ma_window=20, alpha=0.15
+            ),
+        ),
+        "assess_operations": (setup_strategy, run_assess_operations),
+        "get_profitabilities": (setup_strategy, run_get_profitabilities),
+    }
+
+    return cases
+
+
+def measure(setup, run, df, repeat):
+    """
+    Time run(setup(df)) and measure its peak memory
+    :return: dict with best and mean seconds over repeat runs, and peak memory in bytes
+    """
+
+    times = []
+    for _ in range(repeat):
+        arg = setup(df)
+        start = time.perf_counter()
+        run(arg)
+        times.append(time.perf_counter() - start)
+
+    # Memory is measured in a separate run, tracemalloc slows down execution
+    arg = setup(df)
+    tracemalloc.start()
+    run(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"best_s": min(times), "mean_s": sum(times) / len(times), "peak_memory_bytes": peak}
+
+
+def main(sizes=None, cases=None, repeat=3, seed=0, output="benchmark_results.json"):
+    sizes = sizes or list(SIZES)
+    all_cases = get_cases()
+    cases = cases or list(all_cases)
+
+    results = []
+    for size in sizes:
+        n_bars = SIZES[size]
+        df = make_synthetic_klines(n_bars, seed=seed)
+        for case in cases:
+            setup, run = all_cases[case]
+            # Large inputs are only run once
+            n_repeat = repeat if n_bars <= 1_000_000 else 1
+            result = measure(setup, run, df, n_repeat)
+            result.update({"case": case, "size": size, "n_bars": n_bars, "repeat": n_repeat})
+            results.append(result)
+            print(
+                f"{case:<24}{size:>6}  {result['best_s']:10.4f} s"
+                f"  {result['peak_memory_bytes'] / 2**20:10.1f} MiB"
+            )
+        del df
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "seed": seed,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "results": results,
+    }
+
+    with open(output, "w", encoding="UTF-8") as output_file:
+        json.dump(report, output_file, indent=2)
+
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the strategy layer")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=None)
+    parser.add_argument("--cases", nargs="+", choices=list(get_cases()), default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+    main(args.sizes, args.cases, args.repeat, args.seed, args.output)
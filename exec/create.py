@@ -1,6 +1,36 @@
 from trading_tool.db import create_connection, create_table
 import trading_tool.configloader as cfg
 
+
+def create_unique_index(conn, table_name, index_name, columns):
+    """
+    Create a unique index on table_name, removing duplicated rows first (the
+    row with the highest id, i.e. the last inserted, is kept)
+    :param conn: Connection object
+    :param table_name: name of the table
+    :param index_name: name of the index
+    :param columns: list of columns of the index
+    :return:
+    """
+
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,))
+    if cur.fetchone():
+        return
+
+    cols = ", ".join(columns)
+    with conn:
+        # delete duplicates that would make the unique index fail
+        cur.execute(
+            f"""
+            DELETE FROM {table_name}
+            WHERE id NOT IN (SELECT MAX(id) FROM {table_name} GROUP BY {cols})
+            """
+        )
+        print(f"Removed {cur.rowcount} duplicated rows from {table_name}")
+        cur.execute(f"CREATE UNIQUE INDEX {index_name} ON {table_name} ({cols})")
+
+
 def main():
 
     # create assets table
@@ -45,6 +75,54 @@ def main():
     )
     """
 
+    # create klines_1m table
+    create_klines_1m_query = """
+    CREATE TABLE IF NOT EXISTS klines_1m (
+        id integer PRIMARY KEY AUTOINCREMENT, 
+        id_symbol integer NOT NULL, 
+        dateTime integer NOT NULL, 
+        open real NOT NULL, 
+        high real NOT NULL, 
+        low real NOT NULL, 
+        close real NOT NULL, 
+        volume real NOT NULL,
+        closeTime integer NOT NULL,
+        quoteAssetVolume real NOT NULL,
+        numberOfTrades real NOT NULL,
+        takerBuyBaseVol real NOT NULL,
+        takerBuyQuoteVol real NOT NULL, 
+        FOREIGN KEY (id_symbol) REFERENCES symbols (id)
+    )
+    """
+
+    # create backfill_checkpoints table, with the last kline written by
+    # exec/backfill_klines.py for each symbol and interval
+    create_backfill_checkpoints_query = """
+    CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+        id_symbol integer NOT NULL,
+        interval text NOT NULL,
+        startDateTime text NOT NULL,
+        lastDateTime text NOT NULL,
+        updated text NOT NULL,
+        PRIMARY KEY (id_symbol, interval),
+        FOREIGN KEY (id_symbol) REFERENCES symbols (id)
+    )
+    """
+
+    # create empty_kline_ranges table, with the ranges of open times downloaded
+    # by get_klines_1m that have no klines (e.g. before the listing of a symbol)
+    create_empty_kline_ranges_query = """
+    CREATE TABLE IF NOT EXISTS empty_kline_ranges (
+        id_symbol integer NOT NULL,
+        interval text NOT NULL,
+        startDateTime text NOT NULL,
+        endDateTime text NOT NULL,
+        updated text NOT NULL,
+        PRIMARY KEY (id_symbol, interval, startDateTime),
+        FOREIGN KEY (id_symbol) REFERENCES symbols (id)
+    )
+    """
+
     # create a database connection
     conn = create_connection(cfg.DB_FILENAME)
 
@@ -59,6 +137,23 @@ def main():
 
         # create klines table
         create_table(conn, create_klines_1d_query)
+
+        # index klines by symbol and date, also prevents duplicated klines
+        create_unique_index(
+            conn, "klines_1d", "idx_klines_1d_symbol_datetime", ["id_symbol", "dateTime"]
+        )
+
+        # create 1 minute klines table, used as local store by backtesting
+        create_table(conn, create_klines_1m_query)
+        create_unique_index(
+            conn, "klines_1m", "idx_klines_1m_symbol_datetime", ["id_symbol", "dateTime"]
+        )
+
+        # create backfill checkpoints table
+        create_table(conn, create_backfill_checkpoints_query)
+
+        # create empty kline ranges table
+        create_table(conn, create_empty_kline_ranges_query)
     else:
         print("Error! cannot create the database connection.")
 
@@ -0,0 +1,56 @@
+import argparse
+
+import pandas as pd
+
+from trading_tool.archive import write_klines
+from trading_tool.db import create_connection, get_db_klines
+import trading_tool.configloader as cfg
+
+# Klines tables and the interval they hold
+TABLES = {"klines_1d": "1d", "klines_1m": "1m"}
+
+
+def main(symbols=None, root=None):
+    # Create a read-only database connection
+    conn = create_connection(cfg.DB_FILENAME, readonly=True)
+
+    for table_name, interval in TABLES.items():
+        # Databases created before klines_1m existed only have klines_1d
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+        ).fetchone()
+        if not exists:
+            continue
+
+        # Date range stored for each symbol of the table
+        df_ranges = pd.read_sql(
+            f"""
+            SELECT s.symbol, MIN(k.dateTime) AS start, MAX(k.dateTime) AS end
+            FROM {table_name} k
+            JOIN symbols s ON s.id = k.id_symbol
+            GROUP BY s.symbol
+            """,
+            conn,
+        )
+        if symbols:
+            df_ranges = df_ranges[df_ranges["symbol"].isin(symbols)]
+
+        for row in df_ranges.itertuples(index=False):
+            # Export one year at a time to bound memory with 1m klines
+            for start in pd.date_range(pd.Timestamp(row.start).to_period("Y").start_time,
+                                       row.end, freq="YS"):
+                end = min(start + pd.DateOffset(years=1) - pd.Timedelta(seconds=1),
+                          pd.Timestamp(row.end))
+                df = get_db_klines(conn, table_name, row.symbol, start, end)
+                if df.shape[0]:
+                    n_partitions = write_klines(df, row.symbol, interval, root)
+                    print(f"Exported {df.shape[0]} {interval} klines of {row.symbol} "
+                          f"from {start.year} ({n_partitions} files)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the klines tables to the Arrow archive")
+    parser.add_argument("--symbols", nargs="+", default=None)
+    parser.add_argument("--root", default=None)
+    args = parser.parse_args()
+    main(args.symbols, args.root)
@@ -1,5 +1,5 @@
 from trading_tool.db import create_connection, select_query, insert_asset
-from trading_tool.load import get_assets
+from trading_tool.exchange_info import get_exchange_info
 import trading_tool.configloader as cfg
 from trading_tool.client import CLIENT
 
@@ -8,8 +8,9 @@ def main():
     # Create a database connection
     conn = create_connection(cfg.DB_FILENAME)
 
-    # Get the assets available in the Binance API
-    bi_assets = get_assets(CLIENT)
+    # Get the assets available in the Binance API, from the exchange info snapshot
+    # shared with insert_symbols
+    bi_assets = get_exchange_info(CLIENT).assets.tolist()
 
     # Get the assets already stored in the database
     db_assets = select_query(conn, table_name="assets")["asset"].values.tolist()
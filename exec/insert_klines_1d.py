@@ -1,79 +1,116 @@
-from datetime import datetime, date, timedelta
+from datetime import datetime, timedelta
 
 import pandas as pd
 
-from trading_tool.db import create_connection
-from trading_tool.load import get_kline
+from trading_tool.db import create_connection, upsert_many_klines
+from trading_tool.downloader import download_klines
 import trading_tool.configloader as cfg
 from trading_tool.client import CLIENT
 
-# Import the necessary modules
+# Days downloaded for symbols without klines yet
+INITIAL_DAYS = 15
+
+# Number of symbols downloaded at the same time
+MAX_WORKERS = 8
+
+# Number of downloaded symbols written per transaction. Batches are written once
+# downloaded, so the database is never locked while waiting for the API
+WRITE_BATCH_SIZE = 50
+
+
+def get_high_water_marks(conn):
+    """
+    Get the last kline stored of every USD symbol
+    :param conn: Connection object
+    :return: DataFrame with id, symbol, dateTime and closeTime columns, with NaT
+        for symbols without klines
+    """
+
+    # The subqueries read a single row of the (id_symbol, dateTime) index per symbol
+    df = pd.read_sql(
+        """
+        SELECT last.id, last.symbol, last.dateTime, k2.closeTime
+        FROM (
+            SELECT
+            s.id,
+            s.symbol,
+            (SELECT MAX(k.dateTime) FROM klines_1d k WHERE k.id_symbol = s.id) AS dateTime
+            FROM symbols s
+            WHERE s.symbol LIKE '%USD%'
+        ) AS last
+        LEFT JOIN klines_1d k2 ON k2.id_symbol = last.id AND k2.dateTime = last.dateTime
+        """,
+        conn,
+    )
+    df["dateTime"] = pd.to_datetime(df["dateTime"], format="%Y-%m-%d %H:%M:%S")
+    df["closeTime"] = pd.to_datetime(df["closeTime"], format="%Y-%m-%d %H:%M:%S.%f")
+
+    return df
+
+
+def main(client=CLIENT, now=None):
+    """
+    Download the daily klines closed since the last kline stored of every USD symbol
+    :param client: Binance API client, e.g. a ReplayClient to run offline
+    :param now: current time (UTC) (default: None, datetime.utcnow())
+    """
 
-def main():
     # Create a database connection
     conn = create_connection(cfg.DB_FILENAME)
 
-    #### JMGA
-    # TODO: Review this logic to avoid duplicates if executed multiple times
-    # in the same day
-    updated = pd.read_sql("""SELECT MAX(DATE(dateTime)) IS NOT NULL 
-                                    AND MAX(DATE(dateTime)) == DATE('now') 
-                             FROM klines_1d""",conn).all().all()
-    if updated:
-        print("Database is up to date")
-        return
-    ####
-
-    # Read the symbols table from the database
-    symbols = pd.read_sql("SELECT * FROM symbols", conn)
+    # Read the last kline stored of every symbol with USD in its name
+    symbols = get_high_water_marks(conn)
 
-    # Filter the symbols to only include those with USD in their name
-    symbols = symbols[symbols.symbol.str.contains("USD")]
+    now = now or datetime.utcnow()
+    interval = timedelta(days=1)
+    default_start = datetime.combine(
+        now.date() - timedelta(days=INITIAL_DAYS), datetime.min.time()
+    )
 
-    # Set the start and end dates for the kline data
-    start_datetime = date.today() - timedelta(days=15)
-    end_datetime = date.today()
+    # Only symbols whose next bar has already closed need to be downloaded
+    to_update = symbols[~(symbols["closeTime"] + interval >= now)]
+    print(f"{symbols.shape[0] - to_update.shape[0]} symbols are up to date")
 
-    # Initialize an empty list for storing the kline dataframes
-    df_klines = []
+    # Download from the last bar stored, which is downloaded again in case it
+    # was stored before it closed
+    jobs = (
+        (
+            (row.id, row.symbol),
+            {
+                "start_datetime": default_start
+                if pd.isnull(row.dateTime)
+                else row.dateTime.to_pydatetime(),
+                "end_datetime": now,
+                "symbol": row.symbol,
+                "interval": client.KLINE_INTERVAL_1DAY,
+            },
+        )
+        for row in to_update.itertuples(index=False)
+    )
 
     # Get the number of symbols for tracking progress
-    n_klines = symbols.shape[0]
-
-    # Iterate over the symbols
-    for i in range(n_klines):
-        # Calculate the percentage of symbols processed
-        prct = 100 * i / n_klines
-        print(f"--- Progress {prct:.2f} ----")
-        row = symbols.iloc[i]
-        symbol = row[1]  # Get the symbol name
-        # Retrieve the kline data for the current symbol
-        df = get_kline(
-            client=CLIENT,
-            start_datetime=start_datetime,
-            end_datetime=end_datetime,
-            symbol=symbol,
-            interval=CLIENT.KLINE_INTERVAL_1DAY,
-        )
-        # Print the symbol name and the first few rows of the dataframe
-        print(symbol)
-        print(df.head())
-        # Add the symbol's id to the dataframe
-        df["id_symbol"] = row[0]
-        # Append the dataframe to the list of dataframes
-        df_klines.append(df)
-        print(f"Loaded kline_1d for {symbol}")
-
-    # Concatenate the dataframes into a single dataframe
-    df = pd.concat(df_klines)
-
-    # Save the DataFrame to the database
-    ok = df.to_sql(name="klines_1d", con=conn, if_exists="append", index=False)
-    # Check if the save was successful
-    if not ok:
-        print("Some problem with database injection")
-    else:
-        print("Updated database.")
+    n_klines = to_update.shape[0]
+
+    n_rows = 0
+    batch = []
+    for i, ((id_symbol, symbol), df) in enumerate(
+        download_klines(jobs, client=client, max_workers=MAX_WORKERS)
+    ):
+        # Keep only closed bars, the bar still open is stored once it closes
+        df = df.loc[df["closeTime"] < now]
+        prct = 100 * (i + 1) / n_klines
+        print(f"--- Progress {prct:.2f} ---- Loaded {df.shape[0]} kline_1d for {symbol}")
+        batch.append((id_symbol, df))
+
+        # Save the batch in a short transaction; bars already stored and
+        # unchanged are not written
+        if len(batch) >= WRITE_BATCH_SIZE:
+            n_rows += upsert_many_klines(conn, "klines_1d", batch)
+            batch = []
+
+    if batch:
+        n_rows += upsert_many_klines(conn, "klines_1d", batch)
+    print(f"Updated database, {n_rows} rows written.")
 
 
 if __name__ == "__main__":
@@ -1,7 +1,5 @@
-import pandas as pd
-
-from trading_tool.db import create_connection, select_query
-from trading_tool.load import get_symbols
+from trading_tool.db import create_connection, select_query, invalidate_symbol_table
+from trading_tool.exchange_info import get_exchange_info
 import trading_tool.configloader as cfg
 from trading_tool.client import CLIENT
 
@@ -11,20 +9,18 @@ def main():
     # Establish a database connection
     conn = create_connection(cfg.DB_FILENAME)
 
-    # Retrieve the list of symbols from the client
-    bi_symbols = get_symbols(CLIENT)
+    # Retrieve the symbols table from the exchange info snapshot, shared with insert_assets
+    bi_symbols = get_exchange_info(CLIENT).symbols
     # Retrieve the list of symbols already in the database
     db_symbols = select_query(conn, table_name="symbols")["symbol"].values.tolist()
 
-    # Create a list of symbols that need to be loaded
-    symbols_to_load = list(set(s["symbol"] for s in bi_symbols) - set(db_symbols))
-
     # Retrieve the list of assets from the database
     df_assets = select_query(conn, table_name="assets")
 
-    # Create a DataFrame from the symbols that need to be loaded
-    df_symbols = pd.DataFrame(bi_symbols)
-    df_symbols = df_symbols[df_symbols["symbol"].isin(symbols_to_load)]
+    # Keep the symbols that need to be loaded
+    df_symbols = bi_symbols.loc[
+        ~bi_symbols["symbol"].isin(db_symbols), ["symbol", "baseAsset", "quoteAsset"]
+    ]
     # Merge the symbols DataFrame with the assets DataFrame to add the ids of the base and quote assets
     df_symbols = df_symbols.merge(df_assets, left_on="baseAsset", right_on="asset")
     df_symbols["id_baseAsset"] = df_symbols["id"]
@@ -46,6 +42,9 @@ def main():
     else:
         print("Updated database.")
 
+    # Symbol lookups made by this process must see the new symbols
+    invalidate_symbol_table()
+
     print("Symbols loaded.")
 
 
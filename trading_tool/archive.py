@@ -0,0 +1,184 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import trading_tool.configloader as cfg
+
+# pyarrow is optional, only needed by the columnar kline archive
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+# Numeric columns of the archive, in the order of get_kline
+FLOAT_COLUMNS = [
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "quoteAssetVolume",
+    "takerBuyBaseVol",
+    "takerBuyQuoteVol",
+]
+COLUMNS = [
+    "dateTime",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "closeTime",
+    "quoteAssetVolume",
+    "numberOfTrades",
+    "takerBuyBaseVol",
+    "takerBuyQuoteVol",
+]
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The kline archive needs pyarrow, install it with: pip install pyarrow")
+
+
+def get_schema():
+    """
+    Arrow schema of the archive files. Datetimes are stored as UTC milliseconds
+    """
+    _require_pyarrow()
+
+    types = {col: pa.float64() for col in FLOAT_COLUMNS}
+    types.update(
+        {
+            "dateTime": pa.timestamp("ms"),
+            "closeTime": pa.timestamp("ms"),
+            "numberOfTrades": pa.int64(),
+        }
+    )
+
+    return pa.schema([(col, types[col]) for col in COLUMNS])
+
+
+def get_partition_path(symbol, interval, month, root=None):
+    """
+    Path of the file holding the klines of a symbol and interval for one month
+    :param symbol: symbol name
+    :param interval: kline interval, e.g. '1m' or '1d'
+    :param month: pd.Period or 'YYYY-MM' string
+    :param root: archive directory (default: cfg.ARCHIVE_DIR)
+    :return: path of the partition file
+    """
+
+    root = root or cfg.ARCHIVE_DIR
+
+    return os.path.join(root, f"symbol={symbol}", f"interval={interval}", f"{month}.arrow")
+
+
+def _read_partition(path):
+    # Memory-map the file; read_all does not copy the buffers of an uncompressed IPC file
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def write_klines(df, symbol, interval, root=None):
+    """
+    Write klines to the archive, one uncompressed Arrow IPC file per month. Klines
+    already archived for the same dateTime are replaced
+    :param df: DataFrame of klines as returned by get_kline
+    :param symbol: symbol name
+    :param interval: kline interval, e.g. '1m' or '1d'
+    :param root: archive directory (default: cfg.ARCHIVE_DIR)
+    :return: number of partitions written
+    """
+
+    _require_pyarrow()
+    schema = get_schema()
+
+    df = df[COLUMNS]
+    months = df["dateTime"].dt.to_period("M")
+    n_partitions = 0
+    for month, df_month in df.groupby(months):
+        path = get_partition_path(symbol, interval, month, root)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Merge with the klines already in the partition
+        if os.path.exists(path):
+            df_month = pd.concat([_read_partition(path).to_pandas(), df_month], ignore_index=True)
+        df_month = df_month.drop_duplicates("dateTime", keep="last").sort_values("dateTime")
+
+        table = pa.Table.from_pandas(df_month, schema=schema, preserve_index=False)
+        # Write to a temporary file and swap it in, so readers never see a partial file
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        n_partitions += 1
+
+    return n_partitions
+
+
+def read_klines_arrays(symbol, interval, start_datetime, end_datetime, columns=None, root=None):
+    """
+    Read the klines of a symbol whose open time is between two datetimes (both
+    included) as NumPy arrays. Only the partitions of the months in the range are
+    opened; they are memory-mapped and, when the range falls in a single month,
+    the arrays are zero-copy views of the file
+    :param symbol: symbol name
+    :param interval: kline interval, e.g. '1m' or '1d'
+    :param start_datetime: start datetime (UTC)
+    :param end_datetime: end datetime (UTC)
+    :param columns: columns to read (default: all)
+    :param root: archive directory (default: cfg.ARCHIVE_DIR)
+    :return: dict mapping column name to numpy array
+    """
+
+    _require_pyarrow()
+    columns = columns or COLUMNS
+
+    start = np.datetime64(pd.Timestamp(start_datetime), "ms")
+    end = np.datetime64(pd.Timestamp(end_datetime), "ms")
+
+    chunks = {col: [] for col in columns}
+    for month in pd.period_range(start.astype("M8[M]"), end.astype("M8[M]"), freq="M"):
+        path = get_partition_path(symbol, interval, month, root)
+        if not os.path.exists(path):
+            continue
+        table = _read_partition(path)
+
+        # Partitions are sorted by dateTime, so the range is a slice
+        date_time = table.column("dateTime").to_numpy()
+        i = np.searchsorted(date_time, start, side="left")
+        j = np.searchsorted(date_time, end, side="right")
+        if i >= j:
+            continue
+        table = table.slice(i, j - i)
+        for col in columns:
+            chunks[col].append(table.column(col).to_numpy())
+
+    arrays = {}
+    for col in columns:
+        if len(chunks[col]) == 1:
+            arrays[col] = chunks[col][0]
+        elif chunks[col]:
+            arrays[col] = np.concatenate(chunks[col])
+        else:
+            arrays[col] = np.array([], dtype=get_schema().field(col).type.to_pandas_dtype())
+
+    return arrays
+
+
+def read_klines(symbol, interval, start_datetime, end_datetime, columns=None, root=None):
+    """
+    Same as read_klines_arrays, as a DataFrame with the columns and types of get_kline
+    """
+
+    arrays = read_klines_arrays(symbol, interval, start_datetime, end_datetime, columns, root)
+    df = pd.DataFrame(arrays)
+    for col in ["dateTime", "closeTime"]:
+        if col in df:
+            df[col] = df[col].astype("datetime64[ns]")
+
+    return df
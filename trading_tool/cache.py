@@ -0,0 +1,132 @@
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+# Memory the moving average cache may use, in bytes. A year of 1m bars takes
+# about 8 MiB per cube
+MA_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class MovingAverageCube:
+    """
+    Moving averages of a price series for any window.
+
+    Only a single cumulative sum of the prices is kept, so the memory used does
+    not depend on the number of windows and each window is computed from it with
+    a single vectorized pass. Windows of 0 give NaN, like pandas
+    rolling(0).mean().
+
+    ...
+
+    Attributes
+    ----------
+    values : numpy.ndarray
+        prices
+    n : int
+        number of prices
+    nbytes : int
+        memory used by the prices and their cumulative sum, in bytes
+    """
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.values = values
+        self.n = values.shape[0]
+        # Shift by the first value to keep the cumulative sum small and precise
+        self.offset = values[0] if self.n else 0.0
+        self.cumsum = np.concatenate([[0.0], np.cumsum(values - self.offset)])
+        self.nbytes = self.values.nbytes + self.cumsum.nbytes
+
+    def is_fresh(self, values):
+        """
+        Check whether the cube was built from the same prices. The last bar of a
+        range ending now is still open and its close changes while the length
+        does not, so the last price is compared as well as the length
+        :param values: prices of the series
+        :return: bool
+        """
+        if self.n != len(values):
+            return False
+
+        return self.n == 0 or np.array_equal(
+            self.values[-1:], np.asarray(values[-1:], dtype=np.float64), equal_nan=True
+        )
+
+    def get(self, window):
+        """
+        Get the moving average for a window as an array with one value per price
+        :param window: moving average window
+        :return: read-only numpy array, NaN for the first window - 1 rows
+        """
+        ma = np.full(self.n, np.nan)
+        # Mean of the last `window` values for every row with enough history
+        if window == 1:
+            ma[:] = self.values
+        elif 0 < window <= self.n:
+            ma[window - 1 :] = (
+                self.cumsum[window:] - self.cumsum[:-window]
+            ) / window + self.offset
+        ma.flags.writeable = False
+
+        return ma
+
+
+class MovingAverageCache:
+    """
+    In-memory LRU cache of MovingAverageCube objects, bounded by the memory the
+    cubes use.
+
+    Keys identify the price series, e.g. (symbol, interval, start, end). It is
+    shared by Dash callback threads, so access is guarded by a lock.
+
+    ...
+
+    Attributes
+    ----------
+    max_bytes : int
+        memory the cubes may use, in bytes. The last cube is kept even if it
+        alone is larger
+    nbytes : int
+        memory used by the cubes cached, in bytes
+    """
+
+    def __init__(self, max_bytes=MA_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._cubes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, values):
+        """
+        Get the cube for key, computing it from values on a miss
+        :param key: hashable identifier of the price series
+        :param values: prices used to build the cube if it is not cached
+        :return: MovingAverageCube
+        """
+        with self._lock:
+            cube = self._cubes.get(key)
+            # A series with the same key but other prices (e.g. an end date still
+            # in the future, or a last bar still open) is stale
+            if cube is not None and cube.is_fresh(values):
+                self._cubes.move_to_end(key)
+                return cube
+
+        cube = MovingAverageCube(values)
+
+        with self._lock:
+            old_cube = self._cubes.pop(key, None)
+            if old_cube is not None:
+                self.nbytes -= old_cube.nbytes
+            self._cubes[key] = cube
+            self.nbytes += cube.nbytes
+            while self.nbytes > self.max_bytes and len(self._cubes) > 1:
+                _, old_cube = self._cubes.popitem(last=False)
+                self.nbytes -= old_cube.nbytes
+
+        return cube
+
+    def clear(self):
+        with self._lock:
+            self._cubes.clear()
+            self.nbytes = 0
@@ -1,9 +1,230 @@
+import gzip
+import hashlib
+import inspect
+import json
+import os
+import random
+import time
+
 # Import the `Client` class from the `binance` library
 from binance.client import Client
+from binance.helpers import date_to_milliseconds
 import trading_tool.configloader as cfg
 
-# Create a `Client` object using the actual API keys
-CLIENT = Client(cfg.ACTUAL_API_KEY, cfg.ACTUAL_SECRET_KEY)
+# Client modes: live sends requests to Binance, record also saves every response
+# of RECORDED_METHODS as a fixture and replay serves them from fixtures offline
+MODE_LIVE = "live"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+# Methods whose responses are recorded and replayed
+RECORDED_METHODS = [
+    "get_historical_klines",
+    "get_klines",
+    "get_exchange_info",
+    "get_all_tickers",
+    "get_account",
+    "get_recent_trades",
+]
+
+# End argument of the kline methods. Ingestion scripts end their requests at the
+# current time, so kline fixtures are keyed without it and replayed klines are
+# clipped to the end requested
+KLINE_END_ARGS = {"get_historical_klines": "end_str", "get_klines": "endTime"}
+
+
+def get_request(method, args, kwargs):
+    """
+    Get the arguments of a call bound to the signature of the Client method, so
+    positional and keyword calls give the same request
+    :param method: name of the Client method
+    :param args: positional arguments of the call
+    :param kwargs: keyword arguments of the call
+    :return: dict of arguments, as JSON values
+    """
+
+    bound = inspect.signature(getattr(Client, method)).bind(None, *args, **kwargs)
+    bound.apply_defaults()
+    request = {
+        name: value for name, value in bound.arguments.items() if name not in ("self", "params")
+    }
+    request.update(bound.arguments.get("params", {}))
+
+    return json.loads(json.dumps(request, default=str))
+
+
+def get_fixture_path(fixtures_dir, method, request):
+    """
+    Get the fixture file of a request. Kline requests are keyed without their end,
+    so a recording made up to a given time is replayed at any later time
+    :param fixtures_dir: directory of the fixtures of a client
+    :param method: name of the Client method
+    :param request: dict of arguments, as returned by get_request
+    :return: path of the fixture
+    """
+
+    key_request = {
+        name: value for name, value in request.items() if name != KLINE_END_ARGS.get(method)
+    }
+    key = json.dumps(key_request, sort_keys=True)
+    digest = hashlib.sha1(key.encode()).hexdigest()
+
+    return os.path.join(fixtures_dir, method, digest + ".json.gz")
+
+
+def clip_klines(method, request, klines):
+    """
+    Keep the replayed klines that open before the end of a kline request
+    :param method: name of the Client method
+    :param request: dict of arguments, as returned by get_request
+    :param klines: klines recorded for the request
+    :return: list of klines
+    """
+
+    end = request.get(KLINE_END_ARGS.get(method))
+    if end is None:
+        return klines
+    end_ms = int(end) if isinstance(end, int) else date_to_milliseconds(end)
+
+    return [kline for kline in klines if kline[0] <= end_ms]
+
+
+def save_fixture(path, request, response):
+    # Fixtures are gzipped JSON, written atomically as the archive partitions
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="UTF-8") as fixture:
+        json.dump({"request": request, "response": response}, fixture)
+    os.replace(tmp_path, path)
+
+
+def load_fixture(path):
+    with gzip.open(path, "rt", encoding="UTF-8") as fixture:
+        return json.load(fixture)["response"]
+
+
+class RecordingClient:
+    """
+    Binance client that saves the responses of RECORDED_METHODS as fixtures.
+
+    Every other attribute is taken from the wrapped client, so it can be used
+    wherever a Client is.
+
+    ...
+
+    Attributes
+    ----------
+    client : Client
+        client the requests are sent with
+    fixtures_dir : str
+        directory the fixtures are saved to
+    """
+
+    def __init__(self, client, fixtures_dir):
+        self.client = client
+        self.fixtures_dir = fixtures_dir
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name not in RECORDED_METHODS:
+            return attr
+
+        def record(*args, **kwargs):
+            response = attr(*args, **kwargs)
+            request = get_request(name, args, kwargs)
+            save_fixture(get_fixture_path(self.fixtures_dir, name, request), request, response)
+            return response
+
+        return record
+
+
+class ReplayClient:
+    """
+    Offline Binance client that serves the responses of RECORDED_METHODS from the
+    fixtures saved by a RecordingClient, waiting a given latency before every
+    response to simulate the API. Kline requests are matched by everything but
+    their end, and the recorded klines are clipped to the end requested. It has
+    the constants of Client (e.g. the kline intervals) and makes no requests, so
+    importing modules never needs network.
+
+    ...
+
+    Attributes
+    ----------
+    fixtures_dir : str
+        directory the fixtures are read from
+    latency : float
+        seconds every call waits before returning
+    jitter : float
+        maximum seconds added at random to the latency
+    response : None
+        there are no HTTP responses, so no used weight is reported
+    """
+
+    def __init__(self, fixtures_dir, latency=0.0, jitter=0.0):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.response = None
+        # Responses are parsed once and served from memory afterwards
+        self._responses = {}
+
+    def _replay(self, method, args, kwargs):
+        request = get_request(method, args, kwargs)
+        path = get_fixture_path(self.fixtures_dir, method, request)
+        if path not in self._responses:
+            if not os.path.exists(path):
+                raise LookupError(f"No fixture recorded for {method} {args} {kwargs}")
+            self._responses[path] = load_fixture(path)
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        # Callers get their own copy, as they would from the API
+        response = json.loads(json.dumps(self._responses[path]))
+        if method in KLINE_END_ARGS:
+            response = clip_klines(method, request, response)
+
+        return response
+
+    def __getattr__(self, name):
+        if name not in RECORDED_METHODS:
+            raise AttributeError(f"ReplayClient only replays {', '.join(RECORDED_METHODS)}")
+        return lambda *args, **kwargs: self._replay(name, args, kwargs)
+
+
+# Copy the constants of `Client` (kline intervals, order types, ...) to ReplayClient
+for _name in dir(Client):
+    if _name.isupper():
+        setattr(ReplayClient, _name, getattr(Client, _name))
+
+
+def make_client(api_key, secret_key, testnet=False, mode=None):
+    """
+    Create the Binance client of the configured mode
+    :param api_key: API key
+    :param secret_key: secret key
+    :param testnet: whether to use the testnet
+    :param mode: MODE_LIVE, MODE_RECORD or MODE_REPLAY (default: cfg.CLIENT_MODE)
+    :return: Client, RecordingClient or ReplayClient object
+    """
+
+    mode = mode or cfg.CLIENT_MODE
+    # The testnet has its own symbols and balances, so its fixtures are kept apart
+    fixtures_dir = os.path.join(cfg.FIXTURES_DIR, "test" if testnet else "actual")
+
+    if mode == MODE_REPLAY:
+        return ReplayClient(fixtures_dir, cfg.REPLAY_LATENCY, cfg.REPLAY_JITTER)
+
+    client = Client(api_key, secret_key, testnet=testnet)
+    if mode == MODE_RECORD:
+        return RecordingClient(client, fixtures_dir)
+
+    return client
+
+
+# Create a client using the actual API keys
+CLIENT = make_client(cfg.ACTUAL_API_KEY, cfg.ACTUAL_SECRET_KEY)
 
-# Create a `Client` object using the test API keys
-TEST_CLIENT = Client(cfg.TEST_API_KEY, cfg.TEST_SECRET_KEY, testnet=True)
+# Create a client using the test API keys
+TEST_CLIENT = make_client(cfg.TEST_API_KEY, cfg.TEST_SECRET_KEY, testnet=True)
@@ -11,6 +11,19 @@ _ENV_PROD = 'PROD'
 DB_FILENAME = 'trading_tool.db'
 DB_FILE_EXISTS = os.path.exists(DB_FILENAME)
 
+# Columnar kline archive (optional, needs pyarrow)
+ARCHIVE_DIR = 'klines_archive'
+
+# Exchange info snapshot cache
+EXCHANGE_INFO_FILE = 'exchange_info.json'
+
+# Binance client mode: live, record (save responses as fixtures) or replay
+# (serve the fixtures offline, waiting the given latency and random jitter)
+CLIENT_MODE = os.environ.get('CLIENT_MODE', 'live')
+FIXTURES_DIR = os.environ.get('FIXTURES_DIR', 'fixtures')
+REPLAY_LATENCY = float(os.environ.get('REPLAY_LATENCY', 0))
+REPLAY_JITTER = float(os.environ.get('REPLAY_JITTER', 0))
+
 # Try to read the "secret.cfg" file
 try: 
     # Open the file in read-only mode
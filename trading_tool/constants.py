@@ -13,3 +13,7 @@ PRECISION = 7
 
 # Set the initial amount of USDT to 1000
 INITIAL_AMOUNT_USDT = 1000
+
+# Windows offered by the big and small moving average sliders
+BIG_MA_MIN, BIG_MA_MAX, BIG_MA_STEP = 50, 500, 10
+SMALL_MA_MIN, SMALL_MA_MAX, SMALL_MA_STEP = 0, 50, 1
@@ -1,24 +1,80 @@
-# Import the `timedelta` class and `Error` exception from the `datetime` module
-# and the `sqlite3` module
-from datetime import timedelta
+# Import the `datetime` class, the `Error` exception and the `sqlite3` module
+from collections import OrderedDict, deque
+from datetime import datetime
+from itertools import chain
 import sqlite3
 from sqlite3 import Error
+import threading
 
-# Import the `pandas` module
+# Import the `numpy` and `pandas` modules
+import numpy as np
 import pandas as pd
 
-# Import the `get_prices` and `get_kline` functions and the `CLIENT` object
+# Import the `get_kline` function and the `CLIENT` object
 # from the `load` and `client` modules
-from trading_tool.load import get_prices, get_kline
+from trading_tool.load import get_kline
 from trading_tool.client import CLIENT
+from trading_tool.exchange_info import get_exchange_info
+from trading_tool.archive import read_klines
+from trading_tool.tickers import get_ticker_snapshot
+import trading_tool.configloader as cfg
+
+# Columns of the klines tables, besides id and id_symbol, in the order of get_kline
+KLINE_COLUMNS = [
+    "dateTime",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "closeTime",
+    "quoteAssetVolume",
+    "numberOfTrades",
+    "takerBuyBaseVol",
+    "takerBuyQuoteVol",
+]
+
+# Klines table of each interval
+KLINE_TABLES = {"1m": "klines_1m", "1d": "klines_1d"}
+
+# Time the exchange may take to publish a closed bar. Ranges downloaded empty are
+# only recorded as having no bars once their bars closed longer ago than this
+EMPTY_KLINES_DELAY = pd.Timedelta(minutes=1)
+
+# SQLite pragmas applied to every connection: memory-mapped reads and a 32 MiB page cache
+MMAP_SIZE = 256 * 2**20
+CACHE_SIZE_KIB = 32 * 2**10
+
+
+def configure_connection(conn, readonly=False):
+    """
+    Apply the pragmas used by every connection. Writable connections switch the
+    database to WAL journal mode, so that readers are not blocked by a writer
+    :param conn: Connection object
+    :param readonly: whether the connection is read-only
+    :return:
+    """
+
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    # negative cache_size is in KiB
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    if not readonly:
+        conn.execute("PRAGMA journal_mode = WAL")
+        # in WAL mode NORMAL is safe against corruption and avoids a fsync per commit
+        conn.execute("PRAGMA synchronous = NORMAL")
+
 
 # Function to create a connection to a SQLite database
-def create_connection(db_file):
+def create_connection(db_file, readonly=False):
     """create a database connection to a SQLite database"""
     conn = None
     try:
         # Create a connection to the SQLite database file
-        conn = sqlite3.connect(db_file, check_same_thread=False)
+        if readonly:
+            conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(db_file, check_same_thread=False)
+        configure_connection(conn, readonly)
         return conn
     except Error as e:
         # Print any error messages
@@ -26,8 +82,58 @@ def create_connection(db_file):
 
     return conn
 
-# Create a connection to the SQLite database file
-CONN = create_connection("trading_tool.db")
+
+# Connections of each thread, by database file and mode
+_THREAD_CONNECTIONS = threading.local()
+
+
+def get_connection(db_file=None, readonly=False):
+    """
+    Get the connection of the current thread to a SQLite database, creating it
+    on first use. Each thread has its own connection, so Dash callbacks running
+    in different threads do not serialize on a shared one
+    :param db_file: database file (default: cfg.DB_FILENAME)
+    :param readonly: whether to open the database in read-only mode, as used by
+        the web tier
+    :return: Connection object
+    """
+
+    if db_file is None:
+        db_file = cfg.DB_FILENAME
+
+    connections = getattr(_THREAD_CONNECTIONS, "connections", None)
+    if connections is None:
+        connections = _THREAD_CONNECTIONS.connections = {}
+
+    key = (db_file, readonly)
+    conn = connections.get(key)
+    if conn is None:
+        conn = connections[key] = create_connection(db_file, readonly)
+
+    return conn
+
+
+# In-process table of symbol -> (base asset, quote asset) and paths from every
+# asset to USDT built from it, loaded on first use
+_SYMBOL_TABLE = None
+_CONVERSION_PATHS = None
+# MAX(id) and COUNT(*) of the symbols table when the symbol table was read, to
+# detect symbols inserted by other processes (e.g. exec/insert_symbols.py)
+_SYMBOL_TABLE_VERSION = None
+_SYMBOL_TABLE_LOCK = threading.RLock()
+
+# Maximum number of historical rates kept
+RATE_CACHE_MAXSIZE = 100_000
+
+# In-process conversion rates: historical rates by (asset, minute), least recently
+# used first, and spot prices of each client with the ticker snapshot they were
+# computed from
+_RATE_CACHE = OrderedDict()
+_SPOT_PRICES = {}
+# Minute closes by (symbol, start, end), used by the vectorized valuations
+CLOSES_CACHE_MAXSIZE = 16
+_CLOSES_CACHE = OrderedDict()
+_RATE_CACHE_LOCK = threading.Lock()
 
 
 def create_table(conn, create_table_sql):
@@ -136,49 +242,397 @@ def get_db_symbols(conn):
     :return: list of symbols
     """
 
-    # create a query to get a list of distinct symbols from the `symbols` and `klines_1d` tables
+    # create a query to get the symbols with klines, using the (id_symbol, dateTime) index
     query = """
-    SELECT DISTINCT symbol FROM symbols
-    INNER JOIN klines_1d 
-        ON symbols.id = klines_1d.id_symbol
+    SELECT symbol FROM symbols
+    WHERE EXISTS (
+        SELECT 1 FROM klines_1d WHERE klines_1d.id_symbol = symbols.id
+    )
     """
 
     # return the list of symbols
     return pd.read_sql(query, conn)["symbol"].tolist()
 
 
-def get_db_klines_1d(conn, symbol=None, start_date="2022-01-01", end_date="2022-03-01"):
+def get_db_klines_1d(
+    conn, symbol=None, start_date="2022-01-01", end_date="2022-03-01", backend="sqlite"
+):
     """
     Get 1D kline data for a symbol in the database
     :param conn: Connection object
     :param symbol: symbol to get data for (default: None)
     :param start_date: start date in the format 'YYYY-MM-DD' (default: '2022-01-01')
     :param end_date: end date in the format 'YYYY-MM-DD' (default: '2022-03-01')
+    :param backend: 'sqlite' to read the klines_1d table or 'arrow' to read the
+        columnar archive, where dateTime is returned as datetime64 (default: 'sqlite')
     :return: DataFrame containing 1D kline data
     """
 
-    # create a query to get 1D kline data for the specified symbol and date range
-    query = f"""
+    # the archive is memory-mapped and does not need the connection
+    if backend == "arrow":
+        # BETWEEN compares text, so the bar of end_date itself is left out of the
+        # sqlite query; leave it out of the archive read as well
+        return read_klines(
+            symbol,
+            "1d",
+            start_date,
+            pd.Timestamp(end_date) - pd.Timedelta(milliseconds=1),
+            columns=["dateTime", "open", "high", "low", "close"],
+        )
+
+    # create a query to get 1D kline data for the specified symbol and date range,
+    # with bound parameters so that the statement is cached and the
+    # (id_symbol, dateTime) index is used
+    query = """
     SELECT
-    dateTime, 
-    open, 
-    high, 
-    low, 
+    dateTime,
+    open,
+    high,
+    low,
     close
-    FROM symbols
-    INNER JOIN klines_1d 
-        ON symbols.id = klines_1d.id_symbol
-    WHERE symbol = '{symbol}' AND 
-        dateTime BETWEEN '{start_date}' AND '{end_date}'
+    FROM klines_1d
+    WHERE id_symbol = (SELECT id FROM symbols WHERE symbol = ?) AND
+        dateTime BETWEEN ? AND ?
+    ORDER BY dateTime
     """
 
     # get the data as a DataFrame
-    df = pd.read_sql(query, conn)
+    df = pd.read_sql(query, conn, params=(symbol, str(start_date), str(end_date)))
 
     # return the DataFrame
     return df
 
 
+def get_symbol_id(conn, symbol):
+    """
+    Get the id of a symbol in the database
+    :param conn: Connection object
+    :param symbol: symbol name
+    :return: id of the symbol, None if it is not in the database
+    """
+
+    row = conn.execute("SELECT id FROM symbols WHERE symbol = ?", (symbol,)).fetchone()
+
+    return row[0] if row else None
+
+
+def to_db_datetime(values, unit="s"):
+    """
+    Format datetimes as stored in the klines tables ('YYYY-MM-DD HH:MM:SS', the
+    format sqlite3 uses for datetime objects)
+    :param values: datetime64 array or Series
+    :param unit: smallest unit to keep, 's' for dateTime and 'us' for closeTime
+    :return: numpy array of strings
+    """
+
+    values = np.asarray(values, dtype="datetime64[ns]")
+
+    return np.char.replace(np.datetime_as_string(values, unit=unit), "T", " ")
+
+
+def _kline_rows(id_symbol, df):
+    # Rows of a klines DataFrame as inserted in the klines tables. Datetimes are
+    # stored as text, as done by to_sql
+    columns = [df[col].to_numpy().tolist() for col in KLINE_COLUMNS]
+    columns[KLINE_COLUMNS.index("dateTime")] = to_db_datetime(df["dateTime"]).tolist()
+    columns[KLINE_COLUMNS.index("closeTime")] = to_db_datetime(df["closeTime"], "us").tolist()
+
+    return zip([id_symbol] * df.shape[0], *columns)
+
+
+def upsert_many_klines(conn, table_name, klines):
+    """
+    Insert klines of several symbols in a single transaction. Klines already stored
+    for the same symbol and dateTime are updated, and only written if they changed
+    :param conn: Connection object
+    :param table_name: klines table (klines_1d or klines_1m)
+    :param klines: iterable of (id_symbol, DataFrame of klines as returned by get_kline).
+        It is consumed inside the transaction, so it should not wait on the network
+        (e.g. pass a list of downloaded klines rather than a download generator)
+    :return: number of rows inserted or updated
+    """
+
+    rows = chain.from_iterable(_kline_rows(id_symbol, df) for id_symbol, df in klines)
+
+    values_cols = [col for col in KLINE_COLUMNS if col != "dateTime"]
+    sql = f"""
+    INSERT INTO {table_name} (id_symbol, {", ".join(KLINE_COLUMNS)})
+    VALUES ({", ".join(["?"] * (len(KLINE_COLUMNS) + 1))})
+    ON CONFLICT (id_symbol, dateTime) DO UPDATE SET
+        {", ".join(f"{col} = excluded.{col}" for col in values_cols)}
+    WHERE ({", ".join(values_cols)}) IS NOT ({", ".join(f"excluded.{col}" for col in values_cols)})
+    """
+
+    with conn:
+        cur = conn.executemany(sql, rows)
+
+    return cur.rowcount
+
+
+def upsert_klines(conn, table_name, id_symbol, df):
+    """
+    Insert klines of a symbol in a single transaction, see upsert_many_klines
+    :param conn: Connection object
+    :param table_name: klines table (klines_1d or klines_1m)
+    :param id_symbol: id of the symbol
+    :param df: DataFrame of klines as returned by get_kline
+    :return: number of rows inserted or updated
+    """
+
+    if df.shape[0] == 0:
+        return 0
+
+    return upsert_many_klines(conn, table_name, [(id_symbol, df)])
+
+
+def get_db_klines(conn, table_name, symbol, start_datetime, end_datetime):
+    """
+    Get the klines of a symbol whose open time is between two datetimes (both included)
+    :param conn: Connection object
+    :param table_name: klines table (klines_1d or klines_1m)
+    :param symbol: symbol to get data for
+    :param start_datetime: start datetime
+    :param end_datetime: end datetime
+    :return: DataFrame with the same columns and types as get_kline
+    """
+
+    query = f"""
+    SELECT {", ".join(KLINE_COLUMNS)}
+    FROM {table_name}
+    WHERE id_symbol = (SELECT id FROM symbols WHERE symbol = ?) AND
+        dateTime BETWEEN ? AND ?
+    ORDER BY dateTime
+    """
+    start, end = to_db_datetime([start_datetime, end_datetime])
+    df = pd.read_sql(query, conn, params=(symbol, str(start), str(end)))
+
+    # same types as get_kline
+    df["dateTime"] = pd.to_datetime(df["dateTime"], format="%Y-%m-%d %H:%M:%S")
+    df["closeTime"] = pd.to_datetime(df["closeTime"], format="%Y-%m-%d %H:%M:%S.%f")
+    num_cols = [col for col in KLINE_COLUMNS if col not in ("dateTime", "closeTime")]
+    df[num_cols] = df[num_cols].astype(np.float64)
+    df["numberOfTrades"] = df["numberOfTrades"].astype(np.int64)
+
+    return df
+
+
+def get_missing_ranges(
+    date_times, start_datetime, end_datetime, freq, max_gap=1000, empty_ranges=()
+):
+    """
+    Find the ranges of bars missing from a series of open times
+    :param date_times: open times of the bars available
+    :param start_datetime: start of the requested range
+    :param end_datetime: end of the requested range
+    :param freq: pandas frequency of the bars
+    :param max_gap: missing ranges closer than max_gap bars are merged into one, so
+        that they are downloaded with a single request (get_kline uses pages of 1000)
+    :param empty_ranges: tuples (start, end) of open times known to have no bars
+        (e.g. before the listing of the symbol), which are not missing
+    :return: list of tuples (start, end) of open times to download
+    """
+
+    step = pd.Timedelta(freq).value
+    expected = pd.date_range(
+        pd.Timestamp(start_datetime).ceil(freq), pd.Timestamp(end_datetime), freq=freq
+    ).asi8
+    have = np.asarray(date_times, dtype="datetime64[ns]").astype(np.int64)
+    is_missing = ~np.isin(expected, have)
+    for start, end in empty_ranges:
+        is_missing &= (expected < pd.Timestamp(start).value) | (expected > pd.Timestamp(end).value)
+    missing = expected[is_missing]
+    if missing.shape[0] == 0:
+        return []
+
+    # Split the missing bars where the gap to the next missing one is too large
+    breaks = np.flatnonzero(np.diff(missing) > max_gap * step)
+    starts = missing[np.concatenate([[0], breaks + 1])]
+    ends = missing[np.concatenate([breaks, [missing.shape[0] - 1]])]
+
+    return [
+        (pd.Timestamp(s).to_pydatetime(), pd.Timestamp(e).to_pydatetime())
+        for s, e in zip(starts, ends)
+    ]
+
+
+def get_db_empty_ranges(conn, interval, symbol, start_datetime, end_datetime):
+    """
+    Get the ranges of open times known to have no klines that overlap two datetimes
+    :param conn: Connection object
+    :param interval: kline interval
+    :param symbol: symbol name
+    :param start_datetime: start datetime
+    :param end_datetime: end datetime
+    :return: list of tuples (start, end) of open times, as Timestamps
+    """
+
+    start, end = to_db_datetime([start_datetime, end_datetime])
+    rows = conn.execute(
+        """
+        SELECT startDateTime, endDateTime
+        FROM empty_kline_ranges
+        WHERE id_symbol = (SELECT id FROM symbols WHERE symbol = ?) AND interval = ? AND
+            startDateTime <= ? AND endDateTime >= ?
+        """,
+        (symbol, interval, str(end), str(start)),
+    ).fetchall()
+
+    return [(pd.Timestamp(row[0]), pd.Timestamp(row[1])) for row in rows]
+
+
+def save_empty_ranges(conn, id_symbol, interval, ranges):
+    # Record ranges of open times the exchange returned no klines for
+    if not ranges:
+        return
+    rows = [
+        (id_symbol, interval, str(start), str(end))
+        for start, end in zip(
+            to_db_datetime([start for start, _ in ranges]),
+            to_db_datetime([end for _, end in ranges]),
+        )
+    ]
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO empty_kline_ranges
+            (id_symbol, interval, startDateTime, endDateTime, updated)
+            VALUES (?, ?, ?, ?, datetime('now'))
+            ON CONFLICT (id_symbol, interval, startDateTime) DO UPDATE SET
+                endDateTime = max(endDateTime, excluded.endDateTime),
+                updated = excluded.updated
+            """,
+            rows,
+        )
+
+
+def get_klines_1m(symbol, start_datetime, end_datetime, client=CLIENT):
+    """
+    Get 1 minute klines from the local klines_1m store, downloading from the exchange
+    only the ranges that are not stored yet. Closed bars that are downloaded are
+    stored; the bar still open is returned but not stored. Closed bars the exchange
+    has no klines for (e.g. before the listing of the symbol or during outages) are
+    recorded in empty_kline_ranges, so they are not requested again
+    :param symbol: symbol to get data for
+    :param start_datetime: start datetime (UTC)
+    :param end_datetime: end datetime (UTC)
+    :param client: Binance API client
+    :return: DataFrame with the same columns and types as get_kline
+    """
+
+    conn = get_connection()
+    df = get_db_klines(conn, "klines_1m", symbol, start_datetime, end_datetime)
+
+    interval = client.KLINE_INTERVAL_1MINUTE
+    empty_ranges = get_db_empty_ranges(conn, interval, symbol, start_datetime, end_datetime)
+    missing_ranges = get_missing_ranges(
+        df["dateTime"], start_datetime, end_datetime, "1min", empty_ranges=empty_ranges
+    )
+    if not missing_ranges:
+        return df
+
+    id_symbol = get_symbol_id(conn, symbol)
+    now = datetime.utcnow()
+    # Open time of the last bar that closed long enough ago to be published
+    last_closed = pd.Timestamp(now).floor("1min") - pd.Timedelta(minutes=1) - EMPTY_KLINES_DELAY
+    df_downloaded = []
+    for start, end in missing_ranges:
+        df_range = get_kline(
+            client,
+            start_datetime=start,
+            end_datetime=end,
+            symbol=symbol,
+            interval=interval,
+        )
+        if id_symbol is not None:
+            upsert_klines(conn, "klines_1m", id_symbol, df_range.loc[df_range["closeTime"] < now])
+            # Closed bars still missing after the download will never be published
+            if pd.Timestamp(start) <= last_closed:
+                gaps = get_missing_ranges(
+                    df_range["dateTime"], start, min(pd.Timestamp(end), last_closed), "1min", 1
+                )
+                save_empty_ranges(conn, id_symbol, interval, gaps)
+        df_downloaded.append(df_range)
+
+    df = pd.concat([d for d in [df] + df_downloaded if d.shape[0]], ignore_index=True)
+    df = df.drop_duplicates("dateTime", keep="last").sort_values("dateTime", ignore_index=True)
+
+    return df
+
+
+def get_symbols_version():
+    # Cheap fingerprint of the symbols table, read from its primary key
+    return tuple(
+        get_connection(readonly=True)
+        .execute("SELECT MAX(id), COUNT(*) FROM symbols")
+        .fetchone()
+    )
+
+
+def get_symbol_table():
+    """
+    Get the names of the base and quote assets of every symbol in the database.
+    The table is read once per process and kept in memory until
+    invalidate_symbol_table is called, or a lookup misses and the symbols table
+    has changed (see reload_symbol_table_if_changed)
+    :return: dict mapping symbol to a tuple (base asset, quote asset)
+    """
+
+    global _SYMBOL_TABLE, _SYMBOL_TABLE_VERSION
+
+    with _SYMBOL_TABLE_LOCK:
+        if _SYMBOL_TABLE is None:
+            # the version is read first, so rows inserted meanwhile are detected later
+            _SYMBOL_TABLE_VERSION = get_symbols_version()
+            # get the names of the base and quote assets of all symbols in a single query
+            df_coins = pd.read_sql(
+                con=get_connection(readonly=True),
+                sql="""
+                SELECT
+                    symbols.symbol AS symbol,
+                    a_coin.asset AS a_coin,
+                    b_coin.asset AS b_coin
+                FROM symbols AS symbols
+                INNER JOIN assets AS a_coin
+                    ON symbols.id_baseAsset = a_coin.id
+                INNER JOIN assets AS b_coin
+                    ON symbols.id_quoteAsset = b_coin.id
+                """,
+            )
+            _SYMBOL_TABLE = dict(
+                zip(df_coins["symbol"], zip(df_coins["a_coin"], df_coins["b_coin"]))
+            )
+
+        return _SYMBOL_TABLE
+
+
+def invalidate_symbol_table():
+    """
+    Drop the in-memory symbol table so that the next lookup reads the database again.
+    Called after inserting symbols; other processes reload it on their next miss
+    """
+
+    global _SYMBOL_TABLE, _CONVERSION_PATHS
+
+    with _SYMBOL_TABLE_LOCK:
+        _SYMBOL_TABLE = None
+        _CONVERSION_PATHS = None
+
+
+def reload_symbol_table_if_changed():
+    """
+    Drop the in-memory symbol table if the symbols table changed since it was read,
+    e.g. because another process inserted symbols. Called on lookup misses
+    :return: whether the symbol table was dropped
+    """
+
+    with _SYMBOL_TABLE_LOCK:
+        if _SYMBOL_TABLE is None or get_symbols_version() == _SYMBOL_TABLE_VERSION:
+            return False
+        invalidate_symbol_table()
+
+        return True
+
+
 def get_coin_names_from_symbol(symbol):
     """
     Get the names of the base and quote assets for a given symbol
@@ -186,33 +640,203 @@ def get_coin_names_from_symbol(symbol):
     :return: names of the base and quote assets as a tuple
     """
 
-    # get the names of the base and quote assets from the database
-    df_coins = pd.read_sql(
-        con=CONN,
-        sql=f"""
-        SELECT
-            a_coin.asset AS a_coin,
-            b_coin.asset AS b_coin
-        FROM symbols AS symbols
-        INNER JOIN assets AS a_coin
-            ON symbols.id_baseAsset = a_coin.id
-        INNER JOIN assets AS b_coin 
-            ON symbols.id_quoteAsset = b_coin.id
-        WHERE symbols.symbol = '{symbol}'
-        """,
-    )
+    # look up the names in the in-memory symbol table, reading it again once if
+    # the symbol is missing and symbols were inserted since it was read
+    coins = get_symbol_table().get(symbol)
+    if coins is None and reload_symbol_table_if_changed():
+        coins = get_symbol_table().get(symbol)
 
     # if the symbol is not in the database, return None for both names
-    if df_coins.shape[0] == 0:
+    if coins is None:
         print("symbol is not in ddbb")
         return None, None
 
-    # get the names of the base and quote assets
-    a_coin = df_coins["a_coin"].iloc[0]
-    b_coin = df_coins["b_coin"].iloc[0]
-
     # return the names as a tuple
-    return a_coin, b_coin
+    return coins
+
+
+def build_conversion_paths(symbol_table, target="USDT"):
+    """
+    Find the path with the fewest symbols from every asset to a target asset, with
+    a breadth-first search over the graph of symbols
+    :param symbol_table: dict mapping symbol to a tuple (base asset, quote asset)
+    :param target: asset the paths lead to (default: USDT)
+    :return: dict mapping asset to a tuple of (symbol, inverse) steps. Converting
+        along a step multiplies by the price of the symbol, or divides when inverse
+    """
+
+    # edges of every asset: (other asset, symbol, whether the asset is the quote)
+    neighbors = {}
+    for symbol, (base, quote) in sorted(symbol_table.items()):
+        neighbors.setdefault(base, []).append((quote, symbol, False))
+        neighbors.setdefault(quote, []).append((base, symbol, True))
+
+    # search from the target: an asset reached through a symbol converts with the
+    # opposite orientation of the edge it was reached from
+    paths = {target: ()}
+    queue = deque([target])
+    while queue:
+        asset = queue.popleft()
+        for neighbor, symbol, inverse in neighbors.get(asset, []):
+            if neighbor not in paths:
+                paths[neighbor] = ((symbol, not inverse),) + paths[asset]
+                queue.append(neighbor)
+
+    return paths
+
+
+def get_trading_symbols(client=CLIENT):
+    """
+    Get the symbols currently trading, from the cached exchange info snapshot.
+    The symbols table keeps delisted symbols and symbols on break
+    :param client: Binance API client
+    :return: set of symbol names
+    """
+
+    symbols = get_exchange_info(client).symbols
+
+    return set(symbols.loc[symbols["status"] == "TRADING", "symbol"])
+
+
+def get_conversion_paths():
+    """
+    Get the paths to convert every asset to USDT. They are built once from the
+    symbols of the symbol table that are trading and kept until
+    invalidate_symbol_table is called
+    :return: dict mapping asset to a tuple of (symbol, inverse) steps, see
+        build_conversion_paths
+    """
+
+    global _CONVERSION_PATHS
+
+    with _SYMBOL_TABLE_LOCK:
+        if _CONVERSION_PATHS is None:
+            symbol_table = get_symbol_table()
+            try:
+                trading = get_trading_symbols()
+                symbol_table = {
+                    symbol: coins for symbol, coins in symbol_table.items() if symbol in trading
+                }
+            except Exception as exc:
+                # Without the exchange info, every symbol of the database is used
+                print(f"Could not get the trading symbols, using all symbols: {exc}")
+            _CONVERSION_PATHS = build_conversion_paths(symbol_table)
+
+        return _CONVERSION_PATHS
+
+
+def convert_along_path(path, tickers):
+    """
+    Multiply the prices along a conversion path
+    :param path: tuple of (symbol, inverse) steps, see build_conversion_paths
+    :param tickers: dict mapping symbol to its last price
+    :return: conversion rate, None if a symbol of the path has no price
+    """
+
+    rate = 1.0
+    for symbol, inverse in path:
+        price = tickers.get(symbol)
+        if not price:
+            return None
+        rate = rate / price if inverse else rate * price
+
+    return rate
+
+
+def get_conversion_path(asset):
+    """
+    Get the path to convert an asset to USDT
+    :param asset: asset to convert
+    :return: tuple of (symbol, inverse) steps, see build_conversion_paths. Assets
+        that are not in the database use their USDT symbol
+    """
+
+    path = get_conversion_paths().get(asset)
+    if path is None and reload_symbol_table_if_changed():
+        path = get_conversion_paths().get(asset)
+
+    return path if path is not None else ((asset + "USDT", False),)
+
+
+def get_spot_prices(client=CLIENT):
+    """
+    Get the last USDT price of every asset, converting along the conversion path of
+    assets without a USDT symbol. Prices are computed once per ticker snapshot of
+    the client, which is shared by the whole process (see tickers.TickerService)
+    :param client: Binance API client
+    :return: dict mapping asset to its price in USDT
+    """
+
+    snapshot = get_ticker_snapshot(client)
+    with _RATE_CACHE_LOCK:
+        computed_from, prices = _SPOT_PRICES.get(client, (None, None))
+        if computed_from is snapshot:
+            return prices
+
+    # assets with a USDT symbol, also when it is not in the database
+    tickers = snapshot.tickers
+    prices = dict(snapshot.prices)
+
+    # multiply the prices along the path of every other asset
+    for asset, path in get_conversion_paths().items():
+        if asset not in prices:
+            rate = convert_along_path(path, tickers)
+            if rate is not None:
+                prices[asset] = rate
+
+    # assets whose path has a symbol without price (e.g. it stopped trading since
+    # the paths were built) use the shortest path through symbols with a price
+    if any(asset not in prices for asset in get_conversion_paths()):
+        priced_table = {
+            symbol: coins for symbol, coins in get_symbol_table().items() if tickers.get(symbol)
+        }
+        for asset, path in build_conversion_paths(priced_table).items():
+            if asset not in prices:
+                prices[asset] = convert_along_path(path, tickers)
+
+    with _RATE_CACHE_LOCK:
+        _SPOT_PRICES[client] = (snapshot, prices)
+
+    return prices
+
+
+def get_historical_rate(asset, time):
+    """
+    Get the USDT conversion rate of an asset at a given time: along its conversion
+    path, the close of the first 1 minute bar of each symbol opening at or after
+    time. Rates are cached by (asset, minute) and read from the local klines_1m
+    store, so the API is only called on a miss
+    :param asset: asset to get the conversion rate for
+    :param time: time to get the conversion rate for (UTC)
+    :return: USDT conversion rate
+    """
+
+    minute = pd.Timestamp(time).ceil("min").to_pydatetime()
+    key = (asset, minute)
+
+    with _RATE_CACHE_LOCK:
+        if key in _RATE_CACHE:
+            _RATE_CACHE.move_to_end(key)
+            return _RATE_CACHE[key]
+
+    conversion_rate = 1.0
+    closed = True
+    for symbol, inverse in get_conversion_path(asset):
+        df_trade = get_klines_1m(symbol, minute, minute)
+        if df_trade.shape[0] == 0:
+            raise ValueError(f"No 1 minute kline of {symbol} at {minute} to convert {asset}")
+        close = df_trade["close"].iloc[0]
+        conversion_rate = conversion_rate / close if inverse else conversion_rate * close
+        closed = closed and df_trade["closeTime"].iloc[0] < datetime.utcnow()
+
+    # bars still open keep changing, so their rates are not cached
+    if closed:
+        with _RATE_CACHE_LOCK:
+            _RATE_CACHE[key] = conversion_rate
+            while len(_RATE_CACHE) > RATE_CACHE_MAXSIZE:
+                _RATE_CACHE.popitem(last=False)
+
+    return conversion_rate
 
 
 def get_usdt_conversion_rate(asset, time=None):
@@ -227,24 +851,91 @@ def get_usdt_conversion_rate(asset, time=None):
     if asset == "USDT":
         return 1
 
-    # if no time is specified, get the most recent price using get_all_ticker
+    # if no time is specified, get the most recent price from the spot prices
     if time is None:
-        df_prices = get_prices(CLIENT)
-        conversion_rate = df_prices.loc[df_prices["asset"] == asset]["price"][0]
-        return conversion_rate
-
-    # if a time is specified, use klines to calculate the conversion rate
-    symbol = asset + "USDT"
-    df_trade = get_kline(
-        CLIENT,
-        start_datetime=time,
-        end_datetime=time + timedelta(minutes=1),
-        symbol=symbol,
-        interval=CLIENT.KLINE_INTERVAL_1MINUTE,
-    )
-    conversion_rate = df_trade["close"].iloc[0]
-    return conversion_rate
+        return get_spot_prices()[asset]
+
+    # if a time is specified, use 1 minute klines to get the conversion rate
+    return get_historical_rate(asset, time)
+
+
+def get_minute_closes(symbol, start_datetime, end_datetime):
+    """
+    Get the 1 minute closes of a symbol between two datetimes (both included).
+    Closes are read with get_klines_1m and kept in memory, so repeated valuations
+    over the same range do not read the store again
+    :param symbol: symbol to get the closes for
+    :param start_datetime: start datetime (UTC)
+    :param end_datetime: end datetime (UTC)
+    :return: tuple of numpy arrays (open times as datetime64[ns], closes)
+    """
+
+    key = (symbol, pd.Timestamp(start_datetime), pd.Timestamp(end_datetime))
+
+    with _RATE_CACHE_LOCK:
+        if key in _CLOSES_CACHE:
+            _CLOSES_CACHE.move_to_end(key)
+            return _CLOSES_CACHE[key]
+
+    df = get_klines_1m(symbol, key[1].to_pydatetime(), key[2].to_pydatetime())
+    closes = (df["dateTime"].to_numpy(), df["close"].to_numpy(dtype=np.float64))
+    for values in closes:
+        values.flags.writeable = False
+
+    # ranges ending in a bar still open keep changing, so they are not cached
+    if df.shape[0] and df["closeTime"].iloc[-1] < datetime.utcnow():
+        with _RATE_CACHE_LOCK:
+            _CLOSES_CACHE[key] = closes
+            while len(_CLOSES_CACHE) > CLOSES_CACHE_MAXSIZE:
+                _CLOSES_CACHE.popitem(last=False)
+
+    return closes
+
+
+def get_usdt_rates(asset, times):
+    """
+    Vectorized version of get_usdt_conversion_rate for an array of times. For each
+    symbol of the conversion path, the close of the first 1 minute bar opening at
+    or after each time is found with an as-of join against the minute closes of
+    the whole range, and the rates of the path are multiplied
+    :param asset: asset to get the conversion rates for
+    :param times: array or Series of times (UTC)
+    :return: numpy array of USDT conversion rates, NaN where there is no bar
+    """
+
+    times = np.asarray(times, dtype="datetime64[ns]")
+    rates = np.ones(times.shape)
+    if asset == "USDT" or times.shape[0] == 0:
+        return rates
+
+    # round every time up to the minute, as get_historical_rate
+    minute_ns = np.int64(60 * 10**9)
+    minutes = (-(-times.astype(np.int64) // minute_ns) * minute_ns).astype("datetime64[ns]")
+
+    for symbol, inverse in get_conversion_path(asset):
+        date_time, close = get_minute_closes(symbol, minutes.min(), minutes.max())
+
+        # position of the first bar opening at or after each minute
+        idx = np.searchsorted(date_time, minutes, side="left")
+        found = idx < date_time.shape[0]
+        step_rates = np.full(times.shape, np.nan)
+        step_rates[found] = close[idx[found]]
+
+        rates = rates / step_rates if inverse else rates * step_rates
+
+    return rates
+
+
+def to_usdt_series(asset, amounts, times):
+    """
+    Convert amounts of an asset held at different times to USDT
+    :param asset: asset to convert
+    :param amounts: scalar or array of amounts, one per time
+    :param times: array or Series of times (UTC)
+    :return: numpy array of equivalent amounts in USDT
+    """
 
+    return np.asarray(amounts, dtype=np.float64) * get_usdt_rates(asset, times)
 
 
 def to_usdt(asset, amount, time=None):
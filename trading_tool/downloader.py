@@ -0,0 +1,224 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import math
+import random
+import threading
+import time
+
+from binance.helpers import interval_to_milliseconds
+
+from trading_tool.client import CLIENT
+from trading_tool.load import get_kline
+
+# Request weight allowed per minute by Binance for an IP
+WEIGHT_LIMIT = 1200
+
+# Weight of a klines request with limit=1000, as used by get_kline, and of the
+# request get_historical_klines makes first to find the listing date
+KLINES_PAGE_WEIGHT = 5
+KLINES_FIRST_WEIGHT = 1
+
+
+class TokenBucket:
+    """
+    Token bucket of request weight, shared by the threads of a downloader.
+
+    Up to `burst` of the weight limit can be spent at once and the rest refills
+    evenly over the window, so no window of the server ever sees more than the
+    limit. The weight reported by the server after every request also reduces
+    the tokens, to account for other clients using the same IP.
+
+    ...
+
+    Attributes
+    ----------
+    weight_limit : int
+        weight allowed per window
+    window : float
+        length of a weight window in seconds
+    capacity : float
+        maximum number of tokens
+    rate : float
+        tokens refilled per second
+    """
+
+    def __init__(self, weight_limit=WEIGHT_LIMIT, window=60.0, burst=0.1):
+        self.weight_limit = weight_limit
+        self.window = window
+        self.capacity = weight_limit * burst
+        self.rate = weight_limit * (1 - burst) / window
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, weight):
+        """
+        Wait until weight tokens are available and take them
+        :param weight: weight of the request about to be sent
+        """
+        # Requests heavier than the bucket wait for it to be full and leave it in
+        # debt, which later requests wait for
+        needed = min(weight, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= weight
+                    return
+                wait_seconds = (needed - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+    def observe(self, used_weight):
+        """
+        Limit the tokens to the weight the server still allows in its window
+        :param used_weight: weight used in the current window, as reported by the
+            X-MBX-USED-WEIGHT-1M header
+        """
+        # Binance windows are aligned to the clock; tokens refilled before the
+        # window resets must also fit in what is left of it
+        seconds_to_reset = self.window - time.time() % self.window
+        with self._lock:
+            self._refill()
+            allowed = self.weight_limit - used_weight - self.rate * seconds_to_reset
+            self.tokens = min(self.tokens, allowed)
+
+
+def estimate_kline_weight(start_datetime, end_datetime, interval):
+    """
+    Estimate the request weight of a get_kline call
+    :param start_datetime: start datetime of the klines
+    :param end_datetime: end datetime of the klines
+    :param interval: kline interval
+    :return: request weight
+    """
+
+    interval_ms = interval_to_milliseconds(interval)
+    n_klines = (end_datetime - start_datetime).total_seconds() * 1000 / interval_ms
+    n_pages = max(1, math.ceil(n_klines / 1000))
+
+    return KLINES_FIRST_WEIGHT + n_pages * KLINES_PAGE_WEIGHT
+
+
+def is_retryable(exc):
+    # Rate limits, server errors and connection errors are worth retrying;
+    # other API errors (e.g. an invalid symbol) are not
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None:
+        return isinstance(exc, OSError)
+    return status_code in (418, 429) or status_code >= 500
+
+
+def request_with_retries(bucket, weight, func, kwargs, max_retries=5, backoff=1.0):
+    """
+    Call a function that makes requests to the API once the bucket allows it,
+    retrying with exponential backoff
+    :param bucket: TokenBucket shared by all requests to the API
+    :param weight: request weight of the call
+    :param func: function to call, with a client keyword argument
+    :param kwargs: keyword arguments of func, including the client
+    :param max_retries: maximum number of retries
+    :param backoff: seconds to wait before the first retry, doubled on every retry
+    :return: return value of func
+    """
+
+    for attempt in range(max_retries + 1):
+        bucket.acquire(weight)
+        try:
+            result = func(**kwargs)
+        except Exception as exc:
+            if attempt == max_retries or not is_retryable(exc):
+                raise
+            # Wait with jitter, so that threads failing together do not retry together
+            delay = backoff * 2**attempt * random.uniform(0.5, 1.0)
+            response = getattr(exc, "response", None)
+            if getattr(exc, "status_code", None) in (418, 429):
+                bucket.observe(bucket.weight_limit)
+                if response is not None and response.headers.get("Retry-After"):
+                    delay = max(delay, float(response.headers["Retry-After"]))
+            time.sleep(delay)
+            continue
+
+        # The client keeps the last response of any thread; its used weight is
+        # still the latest known value of the window
+        response = getattr(kwargs["client"], "response", None)
+        if response is not None and response.headers.get("X-MBX-USED-WEIGHT-1M"):
+            used_weight = response.headers["X-MBX-USED-WEIGHT-1M"]
+            bucket.observe(int(used_weight))
+
+        return result
+
+
+def fetch_kline(client, bucket, kwargs, max_retries=5, backoff=1.0):
+    """
+    Call get_kline once the bucket allows it, retrying with exponential backoff
+    :param client: Binance API client
+    :param bucket: TokenBucket shared by all requests to the API
+    :param kwargs: keyword arguments of get_kline (start_datetime, end_datetime,
+        symbol and interval)
+    :param max_retries: maximum number of retries
+    :param backoff: seconds to wait before the first retry, doubled on every retry
+    :return: DataFrame of klines
+    """
+
+    weight = estimate_kline_weight(
+        kwargs["start_datetime"], kwargs["end_datetime"], kwargs["interval"]
+    )
+
+    return request_with_retries(
+        bucket, weight, get_kline, dict(kwargs, client=client), max_retries, backoff
+    )
+
+
+def download_klines(jobs, client=CLIENT, max_workers=8, bucket=None, max_retries=5, backoff=1.0):
+    """
+    Download klines concurrently on a bounded thread pool, keeping under the
+    request weight limit of the API
+    :param jobs: iterable of (key, kwargs) tuples, where kwargs are the keyword
+        arguments of get_kline (start_datetime, end_datetime, symbol and interval)
+        and key identifies the job in the results
+    :param client: Binance API client
+    :param max_workers: number of threads
+    :param bucket: TokenBucket shared by all requests (default: a new one with the
+        Binance weight limit)
+    :param max_retries: maximum number of retries of each job
+    :param backoff: seconds to wait before the first retry, doubled on every retry
+    :return: generator of (key, DataFrame) tuples, yielded as downloads finish so
+        that they can be written while the rest are downloading. Jobs that still
+        fail after the retries are reported and skipped
+    """
+
+    bucket = bucket or TokenBucket()
+    jobs = iter(jobs)
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit_next():
+            # Keep at most two jobs per thread in flight, so that results are
+            # consumed as fast as they arrive and memory stays bounded
+            for key, kwargs in jobs:
+                future = executor.submit(fetch_kline, client, bucket, kwargs, max_retries, backoff)
+                pending[future] = key
+                if len(pending) >= 2 * max_workers:
+                    return
+
+        submit_next()
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = pending.pop(future)
+                    try:
+                        df = future.result()
+                    except Exception as exc:
+                        print(f"Failed to download {key}: {exc}")
+                        continue
+                    yield key, df
+                submit_next()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import trading_tool.configloader as cfg
+
+# Seconds a snapshot is used without checking the exchange, and seconds after
+# which it is downloaded again even if the list of symbols did not change
+EXCHANGE_INFO_TTL = 3600
+EXCHANGE_INFO_MAX_AGE = 86400
+
+# Fields of every symbol kept from the exchange info
+SYMBOL_COLUMNS = ["symbol", "baseAsset", "quoteAsset", "status"]
+
+# Snapshots loaded in this process, by cache file
+_SNAPSHOTS = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+class ExchangeInfoSnapshot:
+    """
+    Symbols and assets of the exchange, parsed once from get_exchange_info.
+
+    ...
+
+    Attributes
+    ----------
+    symbols : pd.DataFrame
+        one row per symbol with symbol, baseAsset, quoteAsset and status columns
+    assets : np.ndarray
+        sorted names of every base and quote asset
+    fetched_at : float
+        time the exchange info was downloaded, in seconds since the epoch
+    checked_at : float
+        last time the snapshot was checked against the exchange
+    tickers_hash : str
+        hash of the ticker symbols when the snapshot was checked, used to detect
+        listings and delistings without downloading the exchange info
+    """
+
+    def __init__(self, symbols, fetched_at, checked_at, tickers_hash):
+        self.symbols = symbols
+        self.assets = np.union1d(symbols["baseAsset"].to_numpy(), symbols["quoteAsset"].to_numpy())
+        self.fetched_at = fetched_at
+        self.checked_at = checked_at
+        self.tickers_hash = tickers_hash
+
+    @classmethod
+    def from_exchange_info(cls, exchange_info, tickers_hash, fetched_at=None):
+        # Build the symbol table column by column in a single pass per column
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        symbols = pd.DataFrame(
+            {col: [s[col] for s in exchange_info["symbols"]] for col in SYMBOL_COLUMNS},
+            columns=SYMBOL_COLUMNS,
+        )
+
+        return cls(symbols, fetched_at, fetched_at, tickers_hash)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a snapshot saved with save
+        :param path: cache file
+        :return: ExchangeInfoSnapshot, None if the file does not exist or is invalid
+        """
+        try:
+            with open(path, encoding="UTF-8") as cache_file:
+                data = json.load(cache_file)
+            symbols = pd.DataFrame(data["symbols"], columns=SYMBOL_COLUMNS)
+            return cls(symbols, data["fetched_at"], data["checked_at"], data["tickers_hash"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, path):
+        # Write to a temporary file and swap it in, so readers never see a partial file
+        data = {
+            "fetched_at": self.fetched_at,
+            "checked_at": self.checked_at,
+            "tickers_hash": self.tickers_hash,
+            "symbols": self.symbols.to_dict("list"),
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="UTF-8") as cache_file:
+            json.dump(data, cache_file)
+        os.replace(tmp_path, path)
+
+
+def get_tickers_hash(client):
+    """
+    Hash the symbols of all tickers, a much lighter request than the exchange info
+    :param client: Binance API client
+    :return: hex digest
+    """
+
+    symbols = sorted(ticker["symbol"] for ticker in client.get_all_tickers())
+
+    return hashlib.sha1("\n".join(symbols).encode()).hexdigest()
+
+
+def get_exchange_info(client, ttl=EXCHANGE_INFO_TTL, max_age=EXCHANGE_INFO_MAX_AGE, path=None):
+    """
+    Get the exchange info snapshot, kept in memory and in a cache file. Once the
+    TTL has passed, the ticker symbols are compared with those of the snapshot and
+    the exchange info is only downloaded again if they changed or the snapshot is
+    older than max_age. A cache file holds the snapshot of a single exchange, so
+    clients of different exchanges (e.g. the testnet) must use different paths
+    :param client: Binance API client
+    :param ttl: seconds the snapshot is used without checking the exchange
+    :param max_age: seconds after which the exchange info is always downloaded
+    :param path: cache file (default: cfg.EXCHANGE_INFO_FILE)
+    :return: ExchangeInfoSnapshot
+    """
+
+    path = path or cfg.EXCHANGE_INFO_FILE
+    now = time.time()
+
+    # The lock makes concurrent callers share a single download
+    with _SNAPSHOTS_LOCK:
+        snapshot = _SNAPSHOTS.get(path) or ExchangeInfoSnapshot.load(path)
+        if snapshot is not None and now - snapshot.checked_at < ttl:
+            _SNAPSHOTS[path] = snapshot
+            return snapshot
+
+        tickers_hash = get_tickers_hash(client)
+        if (
+            snapshot is not None
+            and snapshot.tickers_hash == tickers_hash
+            and now - snapshot.fetched_at < max_age
+        ):
+            # No listings or delistings, the snapshot is still valid
+            snapshot.checked_at = now
+        else:
+            snapshot = ExchangeInfoSnapshot.from_exchange_info(
+                client.get_exchange_info(), tickers_hash, now
+            )
+
+        snapshot.save(path)
+        _SNAPSHOTS[path] = snapshot
+
+        return snapshot
@@ -1,35 +1,44 @@
-import re
-
 from datetime import datetime
+from itertools import chain
+import numpy as np
 import pandas as pd
 
+from trading_tool.exchange_info import get_exchange_info
+from trading_tool.tickers import get_ticker_snapshot
+
+# Fields of every kline returned by the Binance API, in order
+KLINE_FIELDS = [
+    "dateTime",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "closeTime",
+    "quoteAssetVolume",
+    "numberOfTrades",
+    "takerBuyBaseVol",
+    "takerBuyQuoteVol",
+    "ignore",
+]
+
 
 def get_assets(client, limit=None):
     """
     Get a list of assets from the Binance API
     :param client: Binance API client
-    :param limit: maximum number of assets to return (default: None)
+    :param limit: maximum number of symbols whose assets are returned (default: None)
     :return: list of assets
     """
 
-    # get exchange info from the API
-    exchange_info = client.get_exchange_info()
-    # if a limit is specified, slice the exchange info to the specified limit
+    # get the symbols from the exchange info snapshot, downloaded at most once per TTL
+    df_symbols = get_exchange_info(client).symbols
+    # if a limit is specified, only use the first symbols
     if limit:
-        exchange_info = exchange_info[slice(limit)]
-
-    # create lists to store the base and quote assets
-    base_asset = []
-    quote_asset = []
+        df_symbols = df_symbols.iloc[:limit]
 
-    # loop through the symbols in the exchange info
-    for s in exchange_info["symbols"]:
-        # add the base and quote assets to the corresponding lists
-        base_asset.append(s["baseAsset"])
-        quote_asset.append(s["quoteAsset"])
-
-    # combine the lists of base and quote assets and remove duplicates
-    assets = list(set(base_asset).union(set(quote_asset)))
+    # combine the base and quote assets and remove duplicates
+    assets = np.union1d(df_symbols["baseAsset"], df_symbols["quoteAsset"]).tolist()
 
     # return the list of assets
     return assets
@@ -43,27 +52,14 @@ def get_symbols(client, limit=None):
     :return: list of symbols
     """
 
-    # get exchange info from the API
-    exchange_info = client.get_exchange_info()
-    # if a limit is specified, slice the exchange info to the specified limit
+    # get the symbols from the exchange info snapshot, downloaded at most once per TTL
+    df_symbols = get_exchange_info(client).symbols
+    # if a limit is specified, only use the first symbols
     if limit:
-        exchange_info = exchange_info[slice(limit)]
-
-    # create a list to store the symbols
-    symbols = []
-    # loop through the symbols in the exchange info
-    for s in exchange_info["symbols"]:
-        # add the symbol, base asset, and quote asset to the list
-        symbols.append(
-            {
-                "symbol": s["symbol"],
-                "baseAsset": s["baseAsset"],
-                "quoteAsset": s["quoteAsset"],
-            }
-        )
+        df_symbols = df_symbols.iloc[:limit]
 
-    # return the list of symbols
-    return symbols
+    # return a list with the symbol, base asset, and quote asset of every symbol
+    return df_symbols[["symbol", "baseAsset", "quoteAsset"]].to_dict("records")
 
 
 def get_kline(
@@ -72,6 +68,7 @@ def get_kline(
     end_datetime=datetime(2022, 1, 1),
     symbol="BTCUSDT",
     interval=None,
+    compact=False,
 ):
     """
     Get klines (candlestick data) from the Binance API
@@ -80,6 +77,7 @@ def get_kline(
     :param end_datetime: end date and time for the klines (default: 2022-01-01)
     :param symbol: symbol for the klines (default: BTCUSDT)
     :param interval: time interval for the klines (default: None)
+    :param compact: use float32 prices and volumes, see decode_klines (default: False)
     :return: DataFrame of klines
     """
 
@@ -100,44 +98,77 @@ def get_kline(
         limit=1000,
     )
 
-    # create a list of column names
-    columns = [
-        "dateTime",
-        "open",
-        "high",
-        "low",
-        "close",
-        "volume",
-        "closeTime",
-        "quoteAssetVolume",
-        "numberOfTrades",
-        "takerBuyBaseVol",
-        "takerBuyQuoteVol",
-        "ignore",
-    ]
-
-    # create a DataFrame from the klines
-    df = pd.DataFrame(kline, columns=columns)
-
-    # convert the dateTime and closeTime columns to datetime objects
-    df.dateTime = pd.to_datetime(df.dateTime, unit="ms")
-    df.closeTime = pd.to_datetime(df.closeTime, unit="ms")
-    num_cols = [
-        "open",
-        "high",
-        "low",
-        "close",
-        "volume",
-        "quoteAssetVolume",
-        "numberOfTrades",
-        "takerBuyBaseVol",
-        "takerBuyQuoteVol",
-    ]
-    df[num_cols] = df[num_cols].apply(pd.to_numeric)
-    # delete 'ignore' column
-    df.drop("ignore", axis=1, inplace=True)
+    return parse_klines(kline, compact)
 
-    return df
+
+def get_kline_page(client, symbol, interval, start_ms, end_ms=None, limit=1000):
+    """
+    Get a single page of klines from the Binance API with one request
+    :param client: Binance API client
+    :param symbol: symbol for the klines
+    :param interval: time interval for the klines
+    :param start_ms: open time in milliseconds from which klines are returned.
+        Klines before the symbol was listed are skipped by the API
+    :param end_ms: last open time in milliseconds (default: None, no limit)
+    :param limit: maximum number of klines (default: 1000, the API maximum)
+    :return: DataFrame of klines, as returned by get_kline
+    """
+
+    params = {"symbol": symbol, "interval": interval, "startTime": start_ms, "limit": limit}
+    if end_ms is not None:
+        params["endTime"] = end_ms
+
+    return parse_klines(client.get_klines(**params))
+
+
+def decode_klines(kline, compact=False):
+    """
+    Decode klines as returned by the Binance API into typed NumPy columns. The
+    klines are flattened into a single object array in one pass and every column
+    is then parsed by NumPy, instead of converting values one column at a time
+    through a DataFrame
+    :param kline: list of klines, each a list of 12 values
+    :param compact: store prices and volumes as float32 instead of float64, which
+        halves their memory but keeps only about 7 significant digits (default: False)
+    :return: dict mapping column name to numpy array, with dateTime and closeTime
+        as int64 milliseconds and numberOfTrades as int32
+    """
+
+    n_klines = len(kline)
+    raw = np.fromiter(
+        chain.from_iterable(kline), dtype=object, count=n_klines * len(KLINE_FIELDS)
+    ).reshape(n_klines, len(KLINE_FIELDS))
+
+    float_dtype = np.float32 if compact else np.float64
+    columns = {}
+    for i, col in enumerate(KLINE_FIELDS):
+        if col in ("dateTime", "closeTime"):
+            columns[col] = raw[:, i].astype(np.int64)
+        elif col == "numberOfTrades":
+            columns[col] = raw[:, i].astype(np.int32)
+        elif col != "ignore":
+            # strings are parsed as float64 and then narrowed, parsing straight to
+            # float32 is slower
+            columns[col] = raw[:, i].astype(np.float64).astype(float_dtype, copy=False)
+
+    return columns
+
+
+def parse_klines(kline, compact=False):
+    """
+    Convert klines as returned by the Binance API to a DataFrame
+    :param kline: list of klines, each a list of 12 values
+    :param compact: use float32 prices and volumes, see decode_klines (default: False)
+    :return: DataFrame of klines
+    """
+
+    columns = decode_klines(kline, compact)
+
+    # convert the dateTime and closeTime columns from milliseconds to datetimes
+    for col in ("dateTime", "closeTime"):
+        columns[col] = columns[col].astype("datetime64[ms]").astype("datetime64[ns]")
+
+    return pd.DataFrame(columns)
 
 
 def get_last_price(client, symbol):
@@ -164,27 +195,43 @@ def get_balances(client):
 
 
 def get_prices(client):
-    # Get all tickers
-    all_tickers = client.get_all_tickers()
-    # Filter out tickers that don't have "USDT" in the symbol
-    symbol_price_pairs = [
-        symbol_price for symbol_price in all_tickers if "USDT" in symbol_price["symbol"]
-    ]
-    # Create a DataFrame from the symbol-price pairs
-    df = pd.DataFrame(symbol_price_pairs)
-    # Convert the "price" column to numeric
-    df["price"] = pd.to_numeric(df["price"])
-    # Extract the asset name from the symbol and add it as a new column
-    df["asset"] = df["symbol"].map(lambda x: re.sub("USDT", "", x))
+    """
+    Get the last price of every asset with a USDT symbol
+    :param client: Binance API client
+    :return: DataFrame with symbol, price and asset columns
+    """
+
+    # Prices come from the shared ticker snapshot, already indexed by asset
+    prices = get_ticker_snapshot(client).prices
+    assets = [asset for asset in prices if asset != "USDT"]
+    df = pd.DataFrame(
+        {
+            "symbol": [asset + "USDT" for asset in assets],
+            "price": [prices[asset] for asset in assets],
+            "asset": assets,
+        }
+    )
 
     return df
 
 
-def get_portfolio(client):
+def get_portfolio(client, prices=None):
+    """
+    Get the free balance of every asset and its value in USDT
+    :param client: Binance API client
+    :param prices: dict mapping asset to its price in USDT, e.g. from
+        db.get_spot_prices, which also covers assets without a USDT symbol
+        (default: None, prices of the USDT symbols from get_prices)
+    :return: DataFrame with asset, free and price_usdt columns
+    """
+
     # Get the balances DataFrame
     df_balances = get_balances(client)
     # Get the prices DataFrame
-    df_prices = get_prices(client)
+    if prices is None:
+        df_prices = get_prices(client)
+    else:
+        df_prices = pd.DataFrame({"asset": list(prices), "price": list(prices.values())})
 
     # Merge the two DataFrames
     df = df_balances.merge(df_prices, on="asset")
@@ -0,0 +1,141 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import numpy as np
+
+
+@dataclass(frozen=True, eq=False)
+class Metrics:
+    """
+    Metrics of a backtested strategy, computed in a single pass by compute_metrics.
+    It holds arrays, so it compares and hashes by identity.
+
+    ...
+
+    Attributes
+    ----------
+    n_operations : np.int64
+        number of rows with a buy or sell operation
+    n_good_operations : int
+        number of operations whose next operation confirms them (see is_good)
+    n_bad_operations : np.int64
+        n_operations - n_good_operations
+    n_operations_by_hour : float
+        operations per hour, rounded to 2 decimals
+    mean_operation_time : str
+        mean time between operations, e.g. "12.5 minutes", or "-"
+    profitabilities : Mapping
+        interval, mean, day, week and year profitabilities, as in
+        Strategy.get_profitabilities
+    equity : np.ndarray
+        wallet value (in coin b) at every row, read-only
+    max_drawdown : float
+        largest relative fall of equity from a previous peak, between 0 and 1
+    sharpe : float
+        annualized Sharpe ratio of the per-row equity returns
+    sortino : float
+        annualized Sortino ratio of the per-row equity returns
+    exposure : float
+        mean fraction of the equity held in coin a
+    """
+
+    n_operations: np.int64
+    n_good_operations: int
+    n_bad_operations: np.int64
+    n_operations_by_hour: float
+    mean_operation_time: str
+    profitabilities: MappingProxyType
+    equity: np.ndarray
+    max_drawdown: float
+    sharpe: float
+    sortino: float
+    exposure: float
+
+
+def compute_metrics(df, start_wallet, end_wallet, periods):
+    """
+    Compute every strategy metric in one vectorized pass over the operations
+    :param df: DataFrame with ds, y, buy, sell, is_operation and is_good columns
+        (as left by Strategy.assess_operations)
+    :param start_wallet: Wallet object at the start of the backtest
+    :param end_wallet: Wallet object at the end of the backtest
+    :param periods: dict of periods as returned by compute_periods
+    :return: Metrics object
+    """
+
+    y = df["y"].to_numpy(dtype=np.float64)
+    buy = df["buy"].to_numpy(dtype=np.float64)
+    sell = df["sell"].to_numpy(dtype=np.float64)
+    is_operation = df["is_operation"].to_numpy(dtype=bool)
+
+    # Count operations and good operations (is_good is True, False or NaN)
+    n_operations = is_operation.sum()
+    n_good_operations = int(df["is_good"].eq(True).sum())
+    n_bad_operations = n_operations - n_good_operations
+    n_operations_by_hour = round(n_operations / periods["hour"], 2)
+
+    # Mean time between operations, in whole minutes of the seconds component of
+    # each gap (same as timedelta.seconds // 60)
+    ds = df["ds"].to_numpy()[is_operation]
+    if ds.shape[0] > 1:
+        gap_seconds = np.diff(ds) // np.timedelta64(1, "s")
+        gap_minutes = (gap_seconds % 86400) // 60
+        mean_operation_time = f"{round(gap_minutes.mean(), 2)} minutes"
+    else:
+        mean_operation_time = "-"
+
+    # Profitabilities, with the same formulas as Strategy.get_profitabilities
+    start_wallet_value = start_wallet.a * y[0] + start_wallet.b
+    end_wallet_value = end_wallet.a * y[-1] + end_wallet.b
+    profitability = (end_wallet_value - start_wallet_value) / start_wallet_value * 100
+    profitabilities = {
+        "interval": profitability,
+        "mean": "NA" if n_operations == 0 else profitability / n_operations,
+        "day": profitability / periods["day"],
+        "week": profitability / periods["week"],
+        "year": profitability / periods["year"],
+    }
+
+    # Holdings at every row: a buy moves buy / y from b to a, a sell moves sell / y from a to b
+    a = start_wallet.a + np.cumsum((buy - sell) / y)
+    b = start_wallet.b + np.cumsum(sell - buy)
+    equity = a * y + b
+    equity.flags.writeable = False
+
+    # Drawdown from the running peak of equity
+    max_drawdown = float(np.max(1 - equity / np.maximum.accumulate(equity)))
+
+    # Risk-adjusted returns, annualized with the number of rows per year. The
+    # length of the backtest is measured in total seconds: periods keeps the
+    # seconds component only (as timedelta.seconds) for the profitabilities
+    returns = np.diff(equity) / equity[:-1]
+    all_ds = df["ds"].to_numpy()
+    n_years = (all_ds[-1] - all_ds[0]) / np.timedelta64(1, "s") / (365 * 86400)
+    sharpe = sortino = np.nan
+    if returns.shape[0] > 1 and n_years > 0:
+        annualization = np.sqrt(returns.shape[0] / n_years)
+        mean_return = returns.mean()
+        std = returns.std()
+        downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2))
+        if std > 0:
+            sharpe = float(mean_return / std * annualization)
+        if downside > 0:
+            sortino = float(mean_return / downside * annualization)
+
+    exposure = float(np.mean(a * y / equity))
+
+    metrics = Metrics(
+        n_operations=n_operations,
+        n_good_operations=n_good_operations,
+        n_bad_operations=n_bad_operations,
+        n_operations_by_hour=n_operations_by_hour,
+        mean_operation_time=mean_operation_time,
+        profitabilities=MappingProxyType(profitabilities),
+        equity=equity,
+        max_drawdown=max_drawdown,
+        sharpe=sharpe,
+        sortino=sortino,
+        exposure=exposure,
+    )
+
+    return metrics
@@ -0,0 +1,406 @@
+import asyncio
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Interval lengths in milliseconds served by the mock klines endpoint
+INTERVAL_MS = {
+    "1m": 60_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "1h": 3_600_000,
+    "4h": 14_400_000,
+    "1d": 86_400_000,
+}
+
+# Open time of the first kline of every symbol (2020-01-01)
+LISTING_MS = 1_577_836_800_000
+
+
+def get_klines_weight(limit):
+    # Request weight of the klines endpoint, which depends on the limit
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def make_klines(symbol, interval, start_ms=None, end_ms=None, limit=500):
+    """
+    Generate deterministic klines in the format of the Binance API
+    :param symbol: symbol name, the same symbol always gives the same prices
+    :param interval: kline interval, a key of INTERVAL_MS
+    :param start_ms: first open time in milliseconds (default: listing time)
+    :param end_ms: last open time in milliseconds (default: now)
+    :param limit: maximum number of klines
+    :return: list of klines, each a list of 12 values
+    """
+
+    step = INTERVAL_MS[interval]
+    start_ms = max(LISTING_MS if start_ms is None else start_ms, LISTING_MS)
+    # Klines open at multiples of the interval, and the last one is still open
+    start_ms = -(-start_ms // step) * step
+    now_ms = int(time.time() * 1000)
+    end_ms = now_ms if end_ms is None else min(end_ms, now_ms)
+    n_klines = max(0, min(limit, (end_ms - start_ms) // step + 1))
+
+    base = 10 + zlib.crc32(symbol.encode()) % 1000
+    klines = []
+    for i in range(n_klines):
+        open_ms = start_ms + i * step
+        wave = (open_ms // step) % 200
+        open_ = base + wave / 100
+        close = base + (wave + 1) / 100
+        volume = 1 + wave
+        klines.append(
+            [
+                open_ms,
+                f"{open_:.8f}",
+                f"{max(open_, close) * 1.001:.8f}",
+                f"{min(open_, close) * 0.999:.8f}",
+                f"{close:.8f}",
+                f"{volume:.8f}",
+                open_ms + step - 1,
+                f"{volume * close:.8f}",
+                10 + wave,
+                f"{volume / 2:.8f}",
+                f"{volume * close / 2:.8f}",
+                "0",
+            ]
+        )
+
+    return klines
+
+
+class MockBinanceServer:
+    """
+    Local HTTP server with the public Binance endpoints used to download klines.
+
+    It serves ping, time and klines under /api/v3, counts request weight per
+    window like Binance, sends it in the X-MBX-USED-WEIGHT-1M header and answers
+    429 with a Retry-After header once the weight limit of the window is exceeded,
+    so downloaders can be tested offline.
+
+    ...
+
+    Attributes
+    ----------
+    weight_limit : int
+        request weight allowed per window
+    window : float
+        length of a weight window in seconds, 60 as on Binance
+    latency : float
+        seconds every request waits before being answered
+    n_requests : int
+        number of requests received
+    n_rejected : int
+        number of requests rejected with 429
+    max_used_weight : int
+        highest weight used in a window by accepted requests
+    """
+
+    def __init__(self, weight_limit=1200, window=60.0, latency=0.0, host="127.0.0.1", port=0):
+        self.weight_limit = weight_limit
+        self.window = window
+        self.latency = latency
+        self.n_requests = 0
+        self.n_rejected = 0
+        self.max_used_weight = 0
+        self._lock = threading.Lock()
+        self._window_id = None
+        self._used_weight = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        # Base URL to use as API_URL of a Client
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def seconds_to_reset(self):
+        # Seconds until the current weight window ends
+        return self.window - time.time() % self.window
+
+    def add_weight(self, weight):
+        """
+        Count the weight of a request in the current window
+        :return: tuple (accepted, weight used in the window)
+        """
+        with self._lock:
+            window_id = int(time.time() // self.window)
+            if window_id != self._window_id:
+                self._window_id = window_id
+                self._used_weight = 0
+            self._used_weight += weight
+            self.n_requests += 1
+            if self._used_weight > self.weight_limit:
+                self.n_rejected += 1
+                return False, self._used_weight
+            self.max_used_weight = max(self.max_used_weight, self._used_weight)
+            return True, self._used_weight
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                # Keep test output clean
+                pass
+
+            def _send(self, status, body, used_weight, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("X-MBX-USED-WEIGHT-1M", str(used_weight))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                if server.latency:
+                    time.sleep(server.latency)
+
+                limit = int(params.get("limit", 500))
+                weight = get_klines_weight(limit) if url.path == "/api/v3/klines" else 1
+                accepted, used_weight = server.add_weight(weight)
+                if not accepted:
+                    retry_after = str(int(server.seconds_to_reset()) + 1)
+                    body = {"code": -1003, "msg": "Too much request weight used."}
+                    self._send(429, body, used_weight, {"Retry-After": retry_after})
+                    return
+
+                if url.path == "/api/v3/ping":
+                    self._send(200, {}, used_weight)
+                elif url.path == "/api/v3/time":
+                    self._send(200, {"serverTime": int(time.time() * 1000)}, used_weight)
+                elif url.path == "/api/v3/klines":
+                    klines = make_klines(
+                        params["symbol"],
+                        params["interval"],
+                        int(params["startTime"]) if "startTime" in params else None,
+                        int(params["endTime"]) if "endTime" in params else None,
+                        limit,
+                    )
+                    self._send(200, klines, used_weight)
+                else:
+                    self._send(404, {"code": -1, "msg": "Unknown endpoint."}, used_weight)
+
+        return Handler
+
+
+def make_client(server):
+    """
+    Create a Binance Client whose requests go to a MockBinanceServer
+    :param server: running MockBinanceServer
+    :return: Client object
+    """
+
+    from binance.client import Client
+
+    class MockClient(Client):
+        API_URL = server.url
+
+    return MockClient()
+
+
+def make_stream_messages(symbols, interval="1m", start_ms=LISTING_MS, n_bars=10, updates=3):
+    """
+    Generate a recording of the combined kline and mini ticker streams, with the
+    bars of make_klines sent as several updates before they close
+    :param symbols: symbol names
+    :param interval: kline interval, a key of INTERVAL_MS
+    :param start_ms: open time of the first bar in milliseconds
+    :param n_bars: number of bars of every symbol
+    :param updates: number of messages of every bar, the last one closing it
+    :return: list of messages as sent by the combined stream
+    """
+
+    step = INTERVAL_MS[interval]
+    klines = {
+        symbol: make_klines(symbol, interval, start_ms, start_ms + (n_bars - 1) * step, n_bars)
+        for symbol in symbols
+    }
+    messages = []
+    for i in range(n_bars):
+        for update in range(updates):
+            closed = update == updates - 1
+            for symbol in symbols:
+                kline = klines[symbol][i]
+                # Open bars report part of the volume, closed bars the final values
+                close = kline[4] if closed else kline[1]
+                event_ms = kline[6] if closed else kline[0] + (update + 1) * step // (updates + 1)
+                messages.append(
+                    {
+                        "stream": f"{symbol.lower()}@kline_{interval}",
+                        "data": {
+                            "e": "kline",
+                            "E": event_ms,
+                            "s": symbol,
+                            "k": {
+                                "t": kline[0],
+                                "T": kline[6],
+                                "s": symbol,
+                                "i": interval,
+                                "o": kline[1],
+                                "c": close,
+                                "h": kline[2],
+                                "l": kline[3],
+                                "v": kline[5],
+                                "n": kline[8],
+                                "x": closed,
+                                "q": kline[7],
+                                "V": kline[9],
+                                "Q": kline[10],
+                            },
+                        },
+                    }
+                )
+                messages.append(
+                    {
+                        "stream": f"{symbol.lower()}@miniTicker",
+                        "data": {"e": "24hrMiniTicker", "E": event_ms, "s": symbol, "c": close},
+                    }
+                )
+
+    return messages
+
+
+def save_recording(messages, path):
+    # Recordings are stored as one JSON message per line
+    with open(path, "w", encoding="UTF-8") as recording:
+        for message in messages:
+            recording.write(json.dumps(message) + "\n")
+
+
+def load_recording(path):
+    with open(path, encoding="UTF-8") as recording:
+        return [json.loads(line) for line in recording if line.strip()]
+
+
+async def record_stream(url, n_messages):
+    """
+    Record messages of a combined stream, e.g. of Binance, to replay them later
+    :param url: combined stream URL, as KlineStream.stream_url
+    :param n_messages: number of messages to record
+    :return: list of messages
+    """
+
+    import websockets
+
+    async with websockets.connect(url) as websocket:
+        return [json.loads(await websocket.recv()) for _ in range(n_messages)]
+
+
+class ReplayWebSocketServer:
+    """
+    Local WebSocket server that replays a recording of the Binance combined streams.
+
+    Every connection to /stream?streams=... gets the messages of the streams it
+    subscribed to, in the order recorded, and is then kept open, so stream clients
+    can be tested offline.
+
+    ...
+
+    Attributes
+    ----------
+    messages : list
+        recorded messages, each with stream and data keys, or raw strings
+    delay : float
+        seconds between messages
+    n_connections : int
+        number of connections received
+    n_sent : int
+        number of messages sent
+    """
+
+    def __init__(self, messages, delay=0.0, host="127.0.0.1", port=0):
+        self.messages = messages
+        self.delay = delay
+        self.host = host
+        self.port = port
+        self.n_connections = 0
+        self.n_sent = 0
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._stopped = None
+
+    @property
+    def url(self):
+        # Base URL to use as url of a KlineStream
+        return f"ws://{self.host}:{self.port}"
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._serve(),))
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    async def _handler(self, websocket):
+        # Older websockets versions have the path on the connection, newer ones on the request
+        path = getattr(websocket, "path", None) or websocket.request.path
+        url = urlparse(path)
+        streams = set(parse_qs(url.query).get("streams", [""])[-1].split("/"))
+        self.n_connections += 1
+        for message in self.messages:
+            # Raw strings are sent as they are to every connection, e.g. to test
+            # malformed messages
+            if isinstance(message, str):
+                await websocket.send(message)
+            elif message["stream"] in streams:
+                await websocket.send(json.dumps(message))
+            else:
+                continue
+            self.n_sent += 1
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        await websocket.wait_closed()
+
+    async def _serve(self):
+        import websockets
+
+        self._stopped = asyncio.Event()
+        async with websockets.serve(self._handler, self.host, self.port) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stopped.wait()
@@ -0,0 +1,232 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from trading_tool.strategy import compute_periods, crossover_kernel
+
+# Prices and periods attached by each worker of moving_average_search
+_WORKER_STATE = {}
+
+
+def get_profitabilities_table(start_value, end_value, periods, n_operations):
+    """
+    Vectorized version of Strategy.get_profitabilities for many parameter sets
+    :param start_value: starting wallet value (scalar or array)
+    :param end_value: array of ending wallet values
+    :param periods: dict of periods as returned by compute_periods
+    :param n_operations: array with the number of operations of each parameter set
+    :return: dict of arrays with interval, mean, day, week and year profitabilities.
+        Mean profitability is NaN when there are no operations
+    """
+
+    # Calculate the overall profitability as a percentage
+    profitability = (end_value - start_value) / start_value * 100
+    # Mean profitability is only defined when there is at least one operation
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_profitability = np.where(n_operations > 0, profitability / n_operations, np.nan)
+
+    profitabilities = {
+        "interval": profitability,
+        "mean": mean_profitability,
+        "day": profitability / periods["day"],
+        "week": profitability / periods["week"],
+        "year": profitability / periods["year"],
+    }
+
+    return profitabilities
+
+
+def simple_strategy_grid(df, start_wallet, alphas, deltas):
+    """
+    Backtest SimpleStrategy for every (alpha, delta) pair in a single pass over
+    the prices. Each parameter set keeps its own reference price and wallet in a
+    state vector, and every bar updates only the parameter sets that trade on it,
+    so results are the same as running SimpleStrategy once per pair.
+    :param df: DataFrame with ds and y columns
+    :param start_wallet: Wallet object with the starting amounts
+    :param alphas: iterable of alpha values
+    :param deltas: iterable of delta values
+    :return: DataFrame with one row per (alpha, delta) pair and columns alpha,
+        delta, a, b, n_operations, interval, mean, day, week and year
+    """
+
+    # Build the grid as flat arrays, one entry per parameter set
+    alpha_grid, delta_grid = np.meshgrid(
+        np.asarray(alphas, dtype=np.float64), np.asarray(deltas, dtype=np.float64), indexing="ij"
+    )
+    alpha = alpha_grid.ravel()
+    delta = delta_grid.ravel()
+    keep = 1 - alpha
+    up = 1 + delta
+    down = 1 - delta
+
+    y = df["y"].to_numpy(dtype=np.float64)
+    n_params = alpha.shape[0]
+
+    # State vectors: wallet, sell/buy thresholds around the reference price and operation counters
+    a = np.full(n_params, float(start_wallet.a))
+    b = np.full(n_params, float(start_wallet.b))
+    ref_value = np.full(n_params, y[0])
+    high = ref_value * up
+    low = ref_value * down
+    n_operations = np.zeros(n_params, dtype=np.int64)
+
+    for iter_value in y.tolist():
+        # Parameter sets whose price rose delta above their reference value sell
+        sells = np.flatnonzero(iter_value >= high)
+        sold = sells[:0]
+        if sells.size:
+            sell = alpha[sells] * a[sells] * iter_value
+            a[sells] = a[sells] * keep[sells]
+            b[sells] = b[sells] + sell
+            high[sells] = iter_value * up[sells]
+            low[sells] = iter_value * down[sells]
+            # Only fills with a positive amount count as operations, as in assess_operations
+            sold = sells[sell > 0]
+            n_operations[sold] += 1
+        # Parameter sets whose price fell delta below their reference value buy
+        buys = np.flatnonzero(iter_value <= low)
+        if buys.size:
+            buy = alpha[buys] * b[buys]
+            a[buys] = a[buys] + buy / iter_value
+            b[buys] = b[buys] * keep[buys]
+            high[buys] = iter_value * up[buys]
+            low[buys] = iter_value * down[buys]
+            bought = buys[buy > 0]
+            n_operations[bought] += 1
+            # A bar with both a sell and a buy counts as a single operation
+            if sold.size and bought.size:
+                n_operations[np.intersect1d(sold, bought, assume_unique=True)] -= 1
+
+    periods = compute_periods(df["ds"].iloc[0], df["ds"].iloc[-1])
+    start_value = start_wallet.a * y[0] + start_wallet.b
+    end_value = a * y[-1] + b
+    profitabilities = get_profitabilities_table(start_value, end_value, periods, n_operations)
+
+    df_results = pd.DataFrame(
+        {
+            "alpha": alpha,
+            "delta": delta,
+            "a": a,
+            "b": b,
+            "n_operations": n_operations,
+            **profitabilities,
+        }
+    )
+
+    return df_results
+
+
+def _init_moving_average_worker(shm_name, shape, periods):
+    # Attach to the shared price array once per worker process
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _WORKER_STATE["shm"] = shm
+    _WORKER_STATE["prices"] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _WORKER_STATE["periods"] = periods
+
+
+def _run_moving_average(big_ma_window, small_ma_window, alphas, a, b):
+    # Backtest every alpha for one pair of windows using the shared prices
+    y, close = _WORKER_STATE["prices"]
+    periods = _WORKER_STATE["periods"]
+
+    # Same moving averages and dropped rows as MovingAverageStrategy
+    y_series = pd.Series(y, copy=False)
+    big_ma = y_series.rolling(big_ma_window).mean().to_numpy()
+    small_ma = y_series.rolling(small_ma_window).mean().to_numpy()
+    diff = big_ma - small_ma
+    valid = ~(np.isnan(diff) | np.isnan(y) | np.isnan(close))
+    diff, close, y = diff[valid], close[valid], y[valid]
+
+    alphas = np.asarray(alphas, dtype=np.float64)
+    end_a = np.full(alphas.shape, np.nan)
+    end_b = np.full(alphas.shape, np.nan)
+    n_operations = np.zeros(alphas.shape, dtype=np.int64)
+    # With no valid rows (e.g. a window of 0) there is nothing to backtest
+    if y.size:
+        for i, alpha in enumerate(alphas.tolist()):
+            buy, sell, end_a[i], end_b[i] = crossover_kernel(diff, close, a, b, alpha)
+            n_operations[i] = np.count_nonzero((buy > 0) | (sell > 0))
+        start_value = a * y[0] + b
+        end_value = end_a * y[-1] + end_b
+    else:
+        start_value = np.nan
+        end_value = end_a
+
+    profitabilities = get_profitabilities_table(start_value, end_value, periods, n_operations)
+
+    results = []
+    for i, alpha in enumerate(alphas.tolist()):
+        result = {
+            "big_ma_window": big_ma_window,
+            "small_ma_window": small_ma_window,
+            "alpha": alpha,
+            "a": end_a[i],
+            "b": end_b[i],
+            "n_operations": n_operations[i],
+        }
+        result.update({name: values[i] for name, values in profitabilities.items()})
+        results.append(result)
+
+    return results
+
+
+def moving_average_search(
+    df, start_wallet, big_ma_windows, small_ma_windows, alphas, max_workers=None
+):
+    """
+    Backtest MovingAverageStrategy for every combination of windows and alpha on
+    a process pool. The y and close columns are copied once into shared memory
+    that every worker attaches to, so tasks only carry their parameters. Each task
+    computes the moving averages of one pair of windows and runs all alphas on them.
+    :param df: DataFrame with ds, y and close columns (as MovingAverageStrategy
+        with compute_ma=True)
+    :param start_wallet: Wallet object with the starting amounts
+    :param big_ma_windows: iterable of big moving average windows
+    :param small_ma_windows: iterable of small moving average windows
+    :param alphas: iterable of alpha values
+    :param max_workers: number of worker processes (default: number of CPUs)
+    :return: generator of dicts with big_ma_window, small_ma_window, alpha, a, b,
+        n_operations, interval, mean, day, week and year, yielded as tasks finish
+    """
+
+    prices = np.vstack(
+        [df["y"].to_numpy(dtype=np.float64), df["close"].to_numpy(dtype=np.float64)]
+    )
+    periods = compute_periods(df["ds"].iloc[0], df["ds"].iloc[-1])
+    alphas = list(alphas)
+
+    # Place the prices in shared memory once for all workers
+    shm = shared_memory.SharedMemory(create=True, size=prices.nbytes)
+    try:
+        np.ndarray(prices.shape, dtype=np.float64, buffer=shm.buf)[:] = prices
+
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_moving_average_worker,
+            initargs=(shm.name, prices.shape, periods),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _run_moving_average,
+                    big_ma_window,
+                    small_ma_window,
+                    alphas,
+                    start_wallet.a,
+                    start_wallet.b,
+                )
+                for big_ma_window, small_ma_window in product(big_ma_windows, small_ma_windows)
+            ]
+            try:
+                # Stream results back as soon as each pair of windows is done
+                for future in as_completed(futures):
+                    yield from future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+    finally:
+        shm.close()
+        shm.unlink()
@@ -1,9 +1,12 @@
 import abc
 import copy
+from collections import deque
+import math
 
 import numpy as np
 
-from trading_tool.db import get_coin_names_from_symbol, to_usdt
+from trading_tool.db import get_coin_names_from_symbol, to_usdt, to_usdt_series
+from trading_tool.metrics import compute_metrics
 
 
 def is_good_operation(row):
@@ -19,7 +22,216 @@ def is_good_operation(row):
     ret = comb1 or comb2
 
     return ret
-    
+
+
+def simple_strategy_kernel(y, a, b, alpha, delta):
+    """
+    Run the SimpleStrategy threshold state machine over an array of prices.
+
+    Same arithmetic, in the same order, as the original row-by-row trader, so
+    results are bit-identical, but it works on plain floats instead of going
+    through df.loc/df.at on every row.
+
+    :param y: 1-D array of prices
+    :param a: starting amount of coin a
+    :param b: starting amount of coin b
+    :param alpha: fraction of the wallet used on each operation
+    :param delta: relative price move that triggers an operation
+    :return: tuple (buy, sell, a, b) where buy and sell are float arrays of the
+        same length as y and a, b are the ending wallet amounts
+    """
+    n = len(y)
+    buy = np.zeros(n)
+    sell = np.zeros(n)
+    if n == 0:
+        return buy, sell, a, b
+
+    # Python floats are much faster to iterate over than numpy scalars
+    prices = np.asarray(y, dtype=np.float64).tolist()
+    up = 1 + delta
+    down = 1 - delta
+    keep = 1 - alpha
+    ref_value = prices[0]
+    for i, iter_value in enumerate(prices):
+        # Sell alpha * a when the price rises delta above the reference value
+        if iter_value >= ref_value * up:
+            sell_i = alpha * a * iter_value
+            sell[i] = sell_i
+            a, b = a * keep, b + sell_i
+            ref_value = iter_value
+        # Buy with alpha * b when the price falls delta below the reference value
+        if iter_value <= ref_value * down:
+            buy_i = alpha * b
+            buy[i] = buy_i
+            a, b = a + buy_i / iter_value, b * keep
+            ref_value = iter_value
+
+    return buy, sell, a, b
+
+
+def crossover_kernel(diff, close, a, b, alpha):
+    """
+    Run the MovingAverageStrategy crossover rules over arrays.
+
+    Crossovers (sign changes of diff between consecutive bars) are located in a
+    single vectorized pass; the wallet is then compounded only over those events.
+
+    :param diff: 1-D array of big_ma - small_ma
+    :param close: 1-D array of prices used to fill the operations
+    :param a: starting amount of coin a
+    :param b: starting amount of coin b
+    :param alpha: fraction of the wallet used on each operation
+    :return: tuple (buy, sell, a, b) where buy and sell are float arrays of the
+        same length as diff and a, b are the ending wallet amounts
+    """
+    diff = np.asarray(diff, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(diff)
+    buy = np.zeros(n)
+    sell = np.zeros(n)
+    if n < 2:
+        return buy, sell, a, b
+
+    previous_diff = diff[:-1]
+    iter_diff = diff[1:]
+    # A sell happens when diff goes from positive to negative, a buy the other way round
+    is_sell = np.zeros(n, dtype=bool)
+    is_buy = np.zeros(n, dtype=bool)
+    is_sell[1:] = (previous_diff > 0) & (iter_diff < 0)
+    is_buy[1:] = (previous_diff < 0) & (iter_diff > 0)
+
+    keep = 1 - alpha
+    events = np.flatnonzero(is_sell | is_buy)
+    for i, price, event_is_sell in zip(
+        events.tolist(), close[events].tolist(), is_sell[events].tolist()
+    ):
+        if event_is_sell:
+            sell_i = alpha * a * price
+            sell[i] = sell_i
+            a, b = a * keep, b + sell_i
+        else:
+            buy_i = alpha * b
+            buy[i] = buy_i
+            a, b = a + buy_i / price, b * keep
+
+    return buy, sell, a, b
+
+
+def compute_periods(start_ds, end_ds):
+    # Calculate the number of seconds, minutes, hours, days, weeks, and years between both dates
+    n_seconds = (end_ds - start_ds).seconds
+    n_minutes = n_seconds / 60
+    n_hours = n_minutes / 60
+    n_days = n_hours / 24
+    n_weeks = n_days / 7
+    n_years = n_days / 365
+    # Create a dictionary containing the number of each type of period
+    periods = {
+        "second": n_seconds,
+        "minute": n_minutes,
+        "hour": n_hours,
+        "day": n_days,
+        "week": n_weeks,
+        "year": n_years,
+    }
+
+    return periods
+
+
+class RollingMean:
+    """
+    Moving average updated one value at a time in O(1).
+
+    Uses the same compensated running sum as pandas' rolling(window).mean(), so
+    the values it returns are the same as the batch computation.
+    """
+
+    __slots__ = (
+        "window",
+        "values",
+        "nobs",
+        "sum_x",
+        "neg_ct",
+        "compensation_add",
+        "compensation_remove",
+        "num_consecutive_same_value",
+        "prev_value",
+    )
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.reset()
+
+    def reset(self):
+        self.values.clear()
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.neg_ct = 0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = None
+
+    def _add(self, val):
+        # NaN values take a place in the window but are not observations, as in pandas
+        self.values.append(val)
+        if math.isnan(val):
+            return
+        self.nobs += 1
+        y = val - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct += 1
+        # Track runs of equal values to return them exactly, as pandas does
+        if val == self.prev_value:
+            self.num_consecutive_same_value += 1
+        else:
+            self.num_consecutive_same_value = 1
+        self.prev_value = val
+
+    def _remove(self):
+        val = self.values.popleft()
+        if math.isnan(val):
+            return
+        self.nobs -= 1
+        y = -val - self.compensation_remove
+        t = self.sum_x + y
+        self.compensation_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct -= 1
+
+    def update(self, val):
+        """
+        Add a new value and return the moving average, NaN while the window has
+        fewer than window non-NaN values
+        """
+        val = float(val)
+        # pandas recomputes windows of size 0 and 1 from scratch on every row
+        if self.window <= 1:
+            self.reset()
+            if self.window == 1:
+                self._add(val)
+        else:
+            if len(self.values) == self.window:
+                self._remove()
+            self._add(val)
+
+        if self.nobs < self.window or self.nobs == 0:
+            return np.nan
+        result = self.sum_x / self.nobs
+        if self.num_consecutive_same_value >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+
+        return result
+
 
 class Strategy(abc.ABC):
     """
@@ -38,17 +250,50 @@ class Strategy(abc.ABC):
 
     **kargs:
         rest of parameters used in trader method
+
+    If df is None the strategy runs in streaming mode: bars are fed one at a time
+    through on_bar, which updates the wallet in O(1) and returns the operation.
     """
 
     def __init__(self, df, start_wallet):
 
         self.df = df
-        self.df["buy"] = 0
-        self.df["sell"] = 0
         self.start_wallet = start_wallet
         self.end_wallet = None
+        self.metrics = None
+        if df is None:
+            self.periods = None
+            return
+        self.df["buy"] = 0
+        self.df["sell"] = 0
         self.periods = self.get_periods()
 
+    def reset_stream(self):
+        """
+        Initialize the streaming state from start_wallet. end_wallet is the
+        wallet updated by on_bar, so it always reflects the bars seen so far.
+        Subclasses extend it with their own state.
+        """
+        self.wallet = copy.copy(self.start_wallet)
+        self.end_wallet = self.wallet
+
+    @abc.abstractmethod
+    def on_bar(self, bar):
+        """
+        Process a new bar in streaming mode.
+
+        bar is a mapping with at least ds and y (and close for strategies that
+        fill at the close price). Must update self.wallet and return a tuple
+        (buy, sell) with the same meaning as the buy and sell columns of trader.
+        """
+
+    def end_stream(self):
+        """
+        Signal that no more bars will come. Returns the operation (buy, sell)
+        done on the last bar, if any
+        """
+        return 0.0, 0.0
+
     @abc.abstractmethod
     def trader(self):
         """
@@ -67,17 +312,30 @@ class Strategy(abc.ABC):
         Should return a pandas.DataFrame with same columns as self.df + is_operation
         and is_good
         """
+        buy = self.df["buy"].to_numpy()
+        y = self.df["y"].to_numpy(dtype=np.float64)
         # Add a new column called "is_operation" that is True if the row has a buy or sell operation
-        self.df["is_operation"] = self.df.apply(
-            lambda row: row["buy"] > 0 or row["sell"] > 0, axis=1
-        )
+        is_operation = (buy > 0) | (self.df["sell"].to_numpy() > 0)
+        self.df["is_operation"] = is_operation
         # Add a new column called "is_buy" that is True if the row has a buy operation
-        self.df["is_buy"] = self.df["buy"] > 0
+        is_buy = buy > 0
+        self.df["is_buy"] = is_buy
         # Add a new column called "y_s1" that contains the y value of the next row with an operation
-        self.df["y_s1"] = self.df.loc[self.df["is_operation"]]["y"].shift(-1)
-        # Add a new column called "is_good" that is True if the operation is good according to the is_good_operation function
-        self.df["is_good"] = self.df.apply(is_good_operation, axis=1)
-
+        operation_idx = np.flatnonzero(is_operation)
+        y_s1 = np.full(len(y), np.nan)
+        y_s1[operation_idx[:-1]] = y[operation_idx[1:]]
+        self.df["y_s1"] = y_s1
+        # Add a new column called "is_good" that is True if the operation is good according to
+        # the same rules as is_good_operation: NaN where y_s1 is NaN, otherwise a bool
+        has_next = ~np.isnan(y_s1)
+        if has_next.any():
+            is_good = np.full(len(y), np.nan, dtype=object)
+            comb1 = is_buy & (y < y_s1)
+            comb2 = ~is_buy & (y > y_s1)
+            is_good[has_next] = (comb1 | comb2)[has_next].tolist()
+        else:
+            is_good = y_s1
+        self.df["is_good"] = is_good
 
     def get_operations(self):
         # Return a DataFrame containing only the rows that have an operation
@@ -85,103 +343,38 @@ class Strategy(abc.ABC):
 
         return df_operations
 
-    def get_n_operations(self):
-        # Sum the number of operations in the DataFrame
-        n_operations = self.df["is_operation"].sum()
+    def get_metrics(self):
+        """
+        Get all the metrics of the strategy as a Metrics object. They are
+        computed in a single pass the first time and reused afterwards
+        """
+        if self.metrics is None:
+            self.metrics = compute_metrics(self.df, self.start_wallet, self.end_wallet, self.periods)
 
-        return n_operations
+        return self.metrics
+
+    def get_n_operations(self):
+        return self.get_metrics().n_operations
 
     def get_periods(self):
-    # Calculate the number of seconds, minutes, hours, days, weeks, and years in the DataFrame
-        n_seconds = (self.df.iloc[-1]["ds"] - self.df.iloc[0]["ds"]).seconds
-        n_minutes = n_seconds / 60
-        n_hours = n_minutes / 60
-        n_days = n_hours / 24
-        n_weeks = n_days / 7
-        n_years = n_days / 365
-        # Create a dictionary containing the number of each type of period
-        periods = {
-            "second": n_seconds,
-            "minute": n_minutes,
-            "hour": n_hours,
-            "day": n_days,
-            "week": n_weeks,
-            "year": n_years,
-        }
-
-        return periods
+        # Calculate the number of each type of period between the first and last rows
+        return compute_periods(self.df.iloc[0]["ds"], self.df.iloc[-1]["ds"])
 
     def get_n_operations_by_hour(self):
-        # Get the total number of operations
-        n_operations = self.get_n_operations()
-        # Divide the total number of operations by the number of hours in the DataFrame
-        n_operations_by_hour = round(n_operations / self.periods["hour"], 2)
-
-        return n_operations_by_hour
+        return self.get_metrics().n_operations_by_hour
 
     def get_mean_operation_time(self):
-        # Get a DataFrame containing only the rows with operations
-        operations = self.get_operations()
-
-        if operations.shape[0] > 1:
-            # Calculate the mean time between operations, in minutes
-            mean_operation_time = (
-                operations["ds"].diff().dropna().apply(lambda x: x.seconds // 60).mean()
-            )
-            # Round the mean time to 2 decimal places
-            mean_operation_time = round(mean_operation_time, 2)
-            # Format the mean time as a string
-            mean_operation_time_str = f"{mean_operation_time} minutes"
-            return mean_operation_time_str
-
-        return "-"
-
+        return self.get_metrics().mean_operation_time
 
     def get_n_good_operations(self):
-        # Get the number of good operations by summing the "is_good" column
-        n_good_operations = self.df["is_good"].sum()
-
-        return n_good_operations
+        return self.get_metrics().n_good_operations
 
     def get_n_bad_operations(self):
-        # Get the number of bad operations by subtracting the number of good operations from the total number of operations
-        n_bad_operations = self.get_n_operations() - self.get_n_good_operations()
-
-        return n_bad_operations
+        return self.get_metrics().n_bad_operations
 
     def get_profitabilities(self):
-        # Calculate the starting value of the wallet using the formula:
-        # a * y-value at index 0 + b
-        start_wallet_value = self.start_wallet.a * self.df["y"].iloc[0] + self.start_wallet.b
-        # Calculate the ending value of the wallet using the formula:
-        # a * y-value at index -1 + b
-        # where -1 is the last index in the DataFrame
-        end_wallet_value = self.end_wallet.a * self.df["y"].iloc[-1] + self.end_wallet.b
-        # Calculate the overall profitability as a percentage
-        profitability = (end_wallet_value - start_wallet_value) / start_wallet_value * 100
-        # Calculate daily, weekly, and yearly profitabilities
-        daily_profitability = profitability / self.periods["day"]
-        weekly_profitability = profitability / self.periods["week"]
-        yearly_profitability = profitability / self.periods["year"]
-        # Get the number of operations
-        n_operations = self.get_n_operations()
-        # If there are no operations, set mean profitability to "NA"
-        if n_operations == 0:
-            mean_profitability = "NA"
-        else:
-            # Calculate mean profitability as a percentage
-            mean_profitability = profitability / self.get_n_operations()
-
         # Return a dictionary of profitabilities
-        profitabilities = {
-            "interval": profitability,
-            "mean": mean_profitability,
-            "day": daily_profitability,
-            "week": weekly_profitability,
-            "year": yearly_profitability,
-        }
-
-        return profitabilities
+        return dict(self.get_metrics().profitabilities)
 
 
 
@@ -192,6 +385,9 @@ class SimpleStrategy(Strategy):
         # Set alpha and delta values
         self.alpha = alpha
         self.delta = delta
+        if df is None:
+            self.reset_stream()
+            return
         # Apply the trader strategy and set the end_wallet
         self.end_wallet = self.trader()
         # Assess the operations performed by the trader
@@ -200,41 +396,49 @@ class SimpleStrategy(Strategy):
         self.profitabilities = self.get_profitabilities()
 
     def trader(self):
-        # Set the reference value to the initial y-value in the DataFrame
-        ref_value = self.df["y"].iloc[0]
         # Make a copy of the starting wallet
         wallet = copy.copy(self.start_wallet)
-        # Iterate through the DataFrame
-        for i, _ in self.df.iterrows():
-            # Get the current y-value
-            iter_value = self.df.loc[i, "y"]
-            # If the current y-value is greater than or equal to the reference value
-            # multiplied by (1 + delta), sell alpha * wallet.a * iter_value
-            if iter_value >= ref_value * (1 + self.delta):
-                self.df.at[i, "sell"] = self.alpha * wallet.a * iter_value
-                # Update wallet.a and wallet.b
-                wallet.a, wallet.b = wallet.a * (1 - self.alpha), wallet.b + self.df.loc[i, "sell"]
-                # Set the reference value to the current y-value
-                ref_value = iter_value
-            # If the current y-value is less than or equal to the reference value
-            # multiplied by (1 - delta), buy alpha * wallet.b / iter_value
-            if iter_value <= ref_value * (1 - self.delta):
-                self.df.at[i, "buy"] = self.alpha * wallet.b
-                # Update wallet.a and wallet.b
-                wallet.a, wallet.b = wallet.a + self.df.at[i, "buy"] / iter_value, wallet.b * (
-                    1 - self.alpha
-                )
-                # Set the reference value to the current y-value
-                ref_value = iter_value
+        # Run the threshold state machine over the price array
+        buy, sell, wallet.a, wallet.b = simple_strategy_kernel(
+            self.df["y"].to_numpy(), wallet.a, wallet.b, self.alpha, self.delta
+        )
+        self.df["buy"] = buy
+        self.df["sell"] = sell
         # Return the updated wallet
         return wallet
 
+    def reset_stream(self):
+        super().reset_stream()
+        # The reference value is set by the first bar
+        self.ref_value = None
+
+    def on_bar(self, bar):
+        # Same rules and arithmetic as simple_strategy_kernel, for a single bar
+        iter_value = bar["y"]
+        if self.ref_value is None:
+            self.ref_value = iter_value
+        wallet = self.wallet
+        buy = sell = 0.0
+        if iter_value >= self.ref_value * (1 + self.delta):
+            sell = self.alpha * wallet.a * iter_value
+            wallet.a, wallet.b = wallet.a * (1 - self.alpha), wallet.b + sell
+            self.ref_value = iter_value
+        if iter_value <= self.ref_value * (1 - self.delta):
+            buy = self.alpha * wallet.b
+            wallet.a, wallet.b = wallet.a + buy / iter_value, wallet.b * (1 - self.alpha)
+            self.ref_value = iter_value
+
+        return buy, sell
+
 
 
 class DummyStrategy(Strategy):
     def __init__(self, df, start_wallet):
         # Initialize the base Strategy class with the given DataFrame, start_wallet
         super().__init__(df, start_wallet)
+        if df is None:
+            self.reset_stream()
+            return
         # Apply the trader strategy and set the end_wallet
         self.end_wallet = self.trader()
         # Assess the operations performed by the trader
@@ -246,12 +450,19 @@ class DummyStrategy(Strategy):
         # Return a copy of the starting wallet without making any changes
         return copy.copy(self.start_wallet)
 
+    def on_bar(self, bar):
+        # Never operate
+        return 0.0, 0.0
+
 
 
 class BFSL(Strategy):
     def __init__(self, df, start_wallet, alpha):
         super().__init__(df, start_wallet)
         self.alpha = alpha
+        if df is None:
+            self.reset_stream()
+            return
         self.end_wallet = self.trader()
         self.assess_operations()
         self.profitabilities = self.get_profitabilities()
@@ -275,6 +486,31 @@ class BFSL(Strategy):
 
         return wallet
 
+    def reset_stream(self):
+        super().reset_stream()
+        self.last_value = None
+
+    def on_bar(self, bar):
+        # Buy on the first bar and remember the price to sell at the end of the stream
+        buy = 0.0
+        if self.last_value is None:
+            buy = self.alpha * self.wallet.b
+            self.wallet.a, self.wallet.b = self.wallet.a + buy / bar["y"], self.wallet.b * (
+                1 - self.alpha
+            )
+        self.last_value = bar["y"]
+
+        return buy, 0.0
+
+    def end_stream(self):
+        # Sell on the last bar seen
+        if self.last_value is None:
+            return 0.0, 0.0
+        sell = self.alpha * self.wallet.a * self.last_value
+        self.wallet.a, self.wallet.b = self.wallet.a * (1 - self.alpha), self.wallet.b + sell
+
+        return 0.0, sell
+
 
 
 class MovingAverageStrategy(Strategy):
@@ -289,6 +525,10 @@ class MovingAverageStrategy(Strategy):
         # create moving average columns
         self.big_ma_window = big_ma_window
         self.small_ma_window = small_ma_window
+        if df is None:
+            self.alpha = alpha
+            self.reset_stream()
+            return
         if compute_ma:
             self.compute_ma()
         self.df["diff"] = self.df["big_ma"] - self.df["small_ma"]
@@ -305,34 +545,49 @@ class MovingAverageStrategy(Strategy):
 
     def trader(self):
         wallet = copy.copy(self.start_wallet)
-        # Get the difference of the moving averages at the previous index
-        previous_diff = self.df["diff"].iloc[0]
-        # Iterate over the remaining rows of the dataframe
-        for i, _ in self.df.iloc[1:].iterrows():
-
-            # Get the difference of the moving averages at the current index
-            iter_diff = self.df["diff"].loc[i]
-
-            # If the previous difference is positive and the current difference is negative, sell
-            if previous_diff > 0 and iter_diff < 0:
-
-                # Set the sell amount in the dataframe and update the wallet
-                self.df.at[i, "sell"] = self.alpha * wallet.a * self.df["close"].loc[i]
-                wallet.a, wallet.b = wallet.a * (1 - self.alpha), wallet.b + self.df.loc[i, "sell"]
-
-            # If the previous difference is negative and the current difference is positive, buy
-            if previous_diff < 0 and iter_diff > 0:
-
-                # Set the buy amount in the dataframe and update the wallet
-                self.df.at[i, "buy"] = self.alpha * wallet.b
-                wallet.a, wallet.b = wallet.a + self.df.at[i, "buy"] / self.df["close"].loc[
-                    i
-                ], wallet.b * (1 - self.alpha)
-
-            previous_diff = iter_diff
+        # Locate the crossovers of the moving averages and compound the wallet over them
+        buy, sell, wallet.a, wallet.b = crossover_kernel(
+            self.df["diff"].to_numpy(),
+            self.df["close"].to_numpy(),
+            wallet.a,
+            wallet.b,
+            self.alpha,
+        )
+        self.df["buy"] = buy
+        self.df["sell"] = sell
 
         return wallet
 
+    def reset_stream(self):
+        super().reset_stream()
+        # Moving averages of y are kept incrementally
+        self.big_rolling_mean = RollingMean(self.big_ma_window)
+        self.small_rolling_mean = RollingMean(self.small_ma_window)
+        self.previous_diff = None
+
+    def on_bar(self, bar):
+        big_ma = self.big_rolling_mean.update(bar["y"])
+        small_ma = self.small_rolling_mean.update(bar["y"])
+        iter_diff = big_ma - small_ma
+        # Bars without both moving averages are skipped, like the rows dropped in batch mode
+        if math.isnan(iter_diff):
+            return 0.0, 0.0
+        previous_diff, self.previous_diff = self.previous_diff, iter_diff
+        if previous_diff is None:
+            return 0.0, 0.0
+
+        wallet = self.wallet
+        buy = sell = 0.0
+        # Same crossover rules as crossover_kernel
+        if previous_diff > 0 and iter_diff < 0:
+            sell = self.alpha * wallet.a * bar["close"]
+            wallet.a, wallet.b = wallet.a * (1 - self.alpha), wallet.b + sell
+        elif previous_diff < 0 and iter_diff > 0:
+            buy = self.alpha * wallet.b
+            wallet.a, wallet.b = wallet.a + buy / bar["close"], wallet.b * (1 - self.alpha)
+
+        return buy, sell
+
 
 
 class Wallet:
@@ -343,11 +598,31 @@ class Wallet:
     of each asset to USDT using a given time, and for calculating the total value 
     of the wallet in USDT.
     """
-    def __init__(self, symbol, a, b):
+
+    __slots__ = ("symbol", "a", "b", "a_name", "b_name")
+
+    def __init__(self, symbol, a, b, a_name=None, b_name=None):
         self.symbol = symbol
         self.a = a
         self.b = b
-        self.a_name, self.b_name = get_coin_names_from_symbol(self.symbol)
+        # Coin names are resolved from the in-memory symbol table unless given
+        if a_name is None or b_name is None:
+            a_name, b_name = get_coin_names_from_symbol(self.symbol)
+        self.a_name, self.b_name = a_name, b_name
+
+    def __copy__(self):
+        # Copy the slots directly, without resolving the coin names again
+        wallet = type(self).__new__(type(self))
+        wallet.symbol = self.symbol
+        wallet.a = self.a
+        wallet.b = self.b
+        wallet.a_name = self.a_name
+        wallet.b_name = self.b_name
+
+        return wallet
+
+    def __repr__(self):
+        return f"Wallet(symbol={self.symbol!r}, a={self.a!r}, b={self.b!r})"
 
     def get_a_coin_usdt(self, time=None):
         # Convert the amount of asset a to USDT using the specified time
@@ -367,3 +642,18 @@ class Wallet:
 
         return value_usdt
 
+    def get_value_usdt_series(self, times, a=None, b=None):
+        """
+        Get the total value in USDT of the wallet at many times, e.g. an equity curve
+        :param times: array or Series of times (UTC)
+        :param a: amounts of asset a, one per time (default: the wallet amount)
+        :param b: amounts of asset b, one per time (default: the wallet amount)
+        :return: numpy array of values in USDT
+        """
+
+        a = self.a if a is None else a
+        b = self.b if b is None else b
+        value_usdt = to_usdt_series(self.a_name, a, times) + to_usdt_series(self.b_name, b, times)
+
+        return value_usdt
+
@@ -0,0 +1,358 @@
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import websockets
+
+from trading_tool.db import (
+    KLINE_COLUMNS,
+    KLINE_TABLES,
+    get_connection,
+    get_symbol_id,
+    upsert_many_klines,
+)
+
+# Binance combined streams endpoint
+STREAM_URL = "wss://stream.binance.com:9443"
+
+# Fields of the kline events of the Binance streams, in the order of KLINE_COLUMNS
+KLINE_EVENT_FIELDS = ["t", "o", "h", "l", "c", "v", "T", "q", "n", "V", "Q"]
+
+
+class RingBuffer:
+    """
+    Most recent bars of a symbol in preallocated NumPy arrays.
+
+    Every column has twice the capacity and each bar is written at two positions,
+    i and i + size, so the last bars are always contiguous in memory and readers
+    get them as views, without copying. The bar still open is updated in place
+    until a bar with a later open time arrives.
+
+    ...
+
+    Attributes
+    ----------
+    size : int
+        maximum number of bars kept
+    n_bars : int
+        number of bars written so far
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.n_bars = 0
+        self._head = 0
+        self._lock = threading.Lock()
+        # Open and close times are kept as int64 milliseconds, as sent by the API
+        self._columns = {
+            col: np.zeros(
+                2 * size, dtype=np.int64 if col in ("dateTime", "closeTime") else np.float64
+            )
+            for col in KLINE_COLUMNS
+        }
+
+    def push(self, bar):
+        """
+        Add a bar, or update the last bar if it has the same open time
+        :param bar: dict with the values of KLINE_COLUMNS, times in milliseconds
+        """
+        with self._lock:
+            last = (self._head - 1) % self.size
+            if self.n_bars and self._columns["dateTime"][last] == bar["dateTime"]:
+                i = last
+            else:
+                i = self._head
+                self._head = (self._head + 1) % self.size
+                self.n_bars += 1
+            for col, values in self._columns.items():
+                values[i] = values[i + self.size] = bar[col]
+
+    def view(self, n=None):
+        """
+        Get the last bars, oldest first, as read-only views of the buffer. Views
+        see later updates of the bars they contain, and the oldest bars are
+        overwritten once more than size bars are pushed
+        :param n: number of bars (default: all the bars kept)
+        :return: dict mapping column name to numpy array
+        """
+        with self._lock:
+            n_kept = min(self.n_bars, self.size)
+            n = n_kept if n is None else min(n, n_kept)
+            # The last n_kept bars start at head (or 0 while the buffer is not full)
+            end = (self._head if self.n_bars >= self.size else 0) + n_kept
+            views = {}
+            for col, values in self._columns.items():
+                view = values[end - n : end]
+                view.flags.writeable = False
+                views[col] = view
+
+        return views
+
+    def to_frame(self, n=None):
+        # Copy of the last bars as a DataFrame with the types of get_kline
+        df = pd.DataFrame({col: values.copy() for col, values in self.view(n).items()})
+        for col in ("dateTime", "closeTime"):
+            df[col] = pd.to_datetime(df[col], unit="ms")
+
+        return df
+
+
+def parse_kline_event(data):
+    """
+    Get the bar of a kline stream event
+    :param data: kline event, as sent by the stream
+    :return: tuple (symbol, bar as a dict of KLINE_COLUMNS, whether the bar is closed)
+    """
+
+    kline = data["k"]
+    bar = {col: float(kline[field]) for col, field in zip(KLINE_COLUMNS, KLINE_EVENT_FIELDS)}
+    bar["dateTime"] = int(kline["t"])
+    bar["closeTime"] = int(kline["T"])
+
+    return data["s"], bar, kline["x"]
+
+
+def write_closed_bars(bars, table_name="klines_1m"):
+    """
+    Write closed bars to a klines table in a single transaction
+    :param bars: list of (symbol, bar) tuples, bars as dicts of KLINE_COLUMNS
+    :param table_name: klines table
+    :return: number of rows inserted or updated
+    """
+
+    conn = get_connection()
+    klines = []
+    for symbol, df in pd.DataFrame(
+        [dict(bar, symbol=symbol) for symbol, bar in bars]
+    ).groupby("symbol"):
+        id_symbol = get_symbol_id(conn, symbol)
+        if id_symbol is None:
+            continue
+        df = df[KLINE_COLUMNS].copy()
+        for col in ("dateTime", "closeTime"):
+            df[col] = pd.to_datetime(df[col], unit="ms")
+        klines.append((id_symbol, df))
+
+    return upsert_many_klines(conn, table_name, klines)
+
+
+class KlineStream:
+    """
+    Streaming ingestion of klines and last prices from the Binance WebSocket API.
+
+    It subscribes to the kline and mini ticker streams of a set of symbols on a
+    background thread, keeps the last bars of every symbol in a RingBuffer and
+    the last price of every symbol in a dict, and writes closed bars to the
+    klines table of the interval in batches, on a separate task so that messages
+    keep being read during writes. It reconnects with backoff when the
+    connection drops.
+
+    ...
+
+    Attributes
+    ----------
+    symbols : list
+        symbols streamed
+    interval : str
+        kline interval, a key of KLINE_TABLES unless a writer is given
+    buffers : dict
+        RingBuffer of every symbol
+    prices : dict
+        last price of every symbol, from the mini ticker stream
+    n_written : int
+        number of closed bars written so far
+    n_dropped : int
+        number of closed bars dropped without being written, when more than
+        max_pending wait to be written (e.g. while the database keeps failing)
+    """
+
+    def __init__(
+        self,
+        symbols,
+        interval="1m",
+        size=1000,
+        url=STREAM_URL,
+        flush_size=500,
+        flush_interval=5.0,
+        writer=None,
+        max_pending=100000,
+    ):
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.interval = interval
+        self.url = url
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.writer = writer or (
+            lambda bars: write_closed_bars(bars, KLINE_TABLES[interval])
+        )
+        self.buffers = {symbol: RingBuffer(size) for symbol in self.symbols}
+        self.prices = {}
+        self.n_written = 0
+        self.n_dropped = 0
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._retry_at = 0.0
+        self._writing = None
+        self._loop = None
+        self._thread = None
+        self._ready = None
+        self._stopped = None
+
+    @property
+    def stream_url(self):
+        # Combined stream of the kline and mini ticker streams of every symbol
+        streams = []
+        for symbol in self.symbols:
+            streams.append(f"{symbol.lower()}@kline_{self.interval}")
+            streams.append(f"{symbol.lower()}@miniTicker")
+        return f"{self.url}/stream?streams={'/'.join(streams)}"
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._main, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        # Stop the connection and write the bars not flushed yet
+        self._loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join()
+        self._loop.close()
+
+    def _main(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._run())
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, message):
+        """
+        Process a message of the combined stream. Malformed events and events of
+        symbols not subscribed are skipped
+        :param message: decoded message, with stream and data keys
+        """
+        try:
+            data = message["data"]
+            if data.get("e") == "kline":
+                symbol, bar, closed = parse_kline_event(data)
+                buffer = self.buffers.get(symbol)
+                if buffer is None:
+                    return
+                buffer.push(bar)
+                if closed:
+                    self._pending.append((symbol, bar))
+                    self._trim_pending()
+            elif data.get("e") == "24hrMiniTicker" and data["s"] in self.buffers:
+                self.prices[data["s"]] = float(data["c"])
+        except (KeyError, TypeError, ValueError, AttributeError) as exc:
+            print(f"Skipping malformed stream message: {exc!r}")
+
+    def _trim_pending(self):
+        # Drop the oldest bars waiting to be written beyond max_pending
+        n_dropped = len(self._pending) - self.max_pending
+        if n_dropped > 0:
+            del self._pending[:n_dropped]
+            self.n_dropped += n_dropped
+            print(
+                f"Dropped {n_dropped} closed bars not written, "
+                f"keeping the last {self.max_pending}"
+            )
+
+    def _flush(self, force=False):
+        """
+        Start writing pending bars when there are enough or they have waited long
+        enough. The write runs on a separate task, so messages keep being read
+        :param force: write the pending bars whatever their number
+        :return: writing task, None if no write was started
+        """
+        if self._writing is not None and not self._writing.done():
+            return None
+        now = time.monotonic()
+        due = now >= self._retry_at and (
+            len(self._pending) >= self.flush_size
+            or now - self._last_flush >= self.flush_interval
+        )
+        if not self._pending or not (force or due):
+            return None
+        bars, self._pending = self._pending, []
+        self._last_flush = now
+        self._writing = asyncio.ensure_future(self._write(bars))
+        return self._writing
+
+    async def _write(self, bars):
+        # Database writes run on a worker thread so that the event loop is not
+        # blocked. Bars are only dropped once written; writing them again is
+        # harmless, so after a failure they are put back and retried once
+        # flush_interval has passed
+        try:
+            n_written = await self._loop.run_in_executor(None, self.writer, bars)
+        except Exception as exc:
+            print(f"Failed to write {len(bars)} closed bars, retrying later: {exc!r}")
+            self._pending[:0] = bars
+            self._trim_pending()
+            self._retry_at = time.monotonic() + self.flush_interval
+            return
+        self.n_written += n_written
+
+    async def _listen(self):
+        async with websockets.connect(self.stream_url) as websocket:
+            while not self._stopped.is_set():
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    self._flush()
+                    continue
+                try:
+                    message = json.loads(message)
+                except ValueError as exc:
+                    print(f"Skipping malformed stream message: {exc!r}")
+                    continue
+                self.handle(message)
+                self._flush()
+
+    async def _run(self):
+        # The event is created here to belong to the loop of the thread
+        self._stopped = asyncio.Event()
+        self._ready.set()
+        backoff = 1.0
+        while not self._stopped.is_set():
+            listener = asyncio.ensure_future(self._listen())
+            stopper = asyncio.ensure_future(self._stopped.wait())
+            await asyncio.wait([listener, stopper], return_when=asyncio.FIRST_COMPLETED)
+            stopper.cancel()
+            if not listener.done():
+                # Let the connection close cleanly before the loop stops
+                listener.cancel()
+                try:
+                    await listener
+                except asyncio.CancelledError:
+                    pass
+                break
+            try:
+                listener.result()
+                backoff = 1.0
+            except Exception as exc:
+                # Reconnect after a dropped connection or any other error, waiting
+                # longer every time, so the stream thread never dies
+                print(f"Stream disconnected, reconnecting in {backoff:.0f} s: {exc!r}")
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), backoff)
+                except asyncio.TimeoutError:
+                    pass
+                backoff = min(2 * backoff, 60.0)
+        # Wait for the write in progress, then write the bars left
+        if self._writing is not None:
+            await self._writing
+        writing = self._flush(force=True)
+        if writing is not None:
+            await writing
@@ -1,3 +1,32 @@
+from datetime import datetime, timedelta
+import os
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from trading_tool.strategy import (
+    BFSL,
+    DummyStrategy,
+    MovingAverageStrategy,
+    SimpleStrategy,
+    Strategy,
+    is_good_operation,
+)
+from trading_tool.client import RecordingClient, ReplayClient
+from trading_tool.downloader import TokenBucket, download_klines, fetch_kline
+from trading_tool.mock_binance import (
+    MockBinanceServer,
+    ReplayWebSocketServer,
+    make_client,
+    make_stream_messages,
+)
+from trading_tool.load import get_kline
+from trading_tool.stream import KlineStream
+
+
 # The `test_strategy` function takes a `strategy` object as an argument
 # and prints information about the strategy object to the console
 def test_strategy(strategy):
@@ -56,3 +85,267 @@ def test_strategy(strategy):
     # along with its class
     print("get_profitabilities", strategy.get_profitabilities())
     print("class of get_profitabilities", type(strategy.get_profitabilities()))
+
+
+# Row-wise implementation of `Strategy.assess_operations` kept as the reference
+# the columnar version is checked against
+def legacy_assess_operations(df):
+    df["is_operation"] = df.apply(lambda row: row["buy"] > 0 or row["sell"] > 0, axis=1)
+    df["is_buy"] = df["buy"] > 0
+    df["y_s1"] = df.loc[df["is_operation"]]["y"].shift(-1)
+    df["is_good"] = df.apply(is_good_operation, axis=1)
+
+    return df
+
+
+# The `test_assess_operations` function builds random frames with sparse buy and
+# sell operations and checks that `Strategy.assess_operations` gives the same
+# columns as the row-wise reference
+def test_assess_operations(n_frames=50, n_rows=200, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    for _ in range(n_frames):
+        # Random walk of prices with some NaN and operations on a few rows
+        y = 100 + rng.normal(size=n_rows).cumsum()
+        y[rng.random(n_rows) < 0.02] = np.nan
+        buy = np.where(rng.random(n_rows) < rng.uniform(0, 0.3), rng.random(n_rows), 0)
+        sell = np.where(rng.random(n_rows) < rng.uniform(0, 0.3), rng.random(n_rows), 0)
+        df = pd.DataFrame({"y": y, "buy": buy, "sell": sell})
+
+        expected = legacy_assess_operations(df.copy())
+        strategy = SimpleNamespace(df=df.copy())
+        Strategy.assess_operations(strategy)
+
+        for col in ["is_operation", "is_buy", "y_s1", "is_good"]:
+            pd.testing.assert_series_equal(strategy.df[col], expected[col])
+
+    print("assess_operations matches the row-wise implementation on", n_frames, "frames")
+
+
+# The `test_on_bar` function feeds random bars one at a time to every strategy in
+# streaming mode and checks that operations and ending wallet match the batch run
+def test_on_bar(n_rows=2000, seed=0):
+
+    rng = np.random.default_rng(seed)
+    y = 100 * np.exp(rng.normal(scale=0.005, size=n_rows).cumsum())
+    # A gap in the feed: moving averages must recover once the window moves past it
+    y[n_rows // 4] = np.nan
+    df = pd.DataFrame(
+        {"ds": pd.date_range("2022-01-01", periods=n_rows, freq="min"), "y": y, "close": y}
+    )
+
+    strategies = [
+        (DummyStrategy, {}),
+        (BFSL, {"alpha": 0.2}),
+        (SimpleStrategy, {"alpha": 0.15, "delta": 0.004}),
+        (MovingAverageStrategy, {"big_ma_window": 100, "small_ma_window": 20, "alpha": 0.15}),
+        (MovingAverageStrategy, {"big_ma_window": 50, "small_ma_window": 1, "alpha": 0.3}),
+    ]
+
+    for strategy_class, params in strategies:
+        batch = strategy_class(
+            df=df.copy(), start_wallet=SimpleNamespace(symbol="X", a=1.0, b=100.0), **params
+        )
+        stream = strategy_class(
+            df=None, start_wallet=SimpleNamespace(symbol="X", a=1.0, b=100.0), **params
+        )
+        operations = [stream.on_bar(bar) for bar in df.to_dict("records")]
+        last_buy, last_sell = stream.end_stream()
+        operations[-1] = (operations[-1][0] + last_buy, operations[-1][1] + last_sell)
+        operations = pd.DataFrame(operations, columns=["buy", "sell"], index=df.index)
+
+        # Batch strategies may drop rows (MovingAverageStrategy), compare on the rows they kept
+        operations = operations.loc[batch.df.index]
+        assert (operations["buy"].to_numpy() == batch.df["buy"].to_numpy()).all()
+        assert (operations["sell"].to_numpy() == batch.df["sell"].to_numpy()).all()
+        assert stream.end_wallet.a == batch.end_wallet.a
+        assert stream.end_wallet.b == batch.end_wallet.b
+
+        print(strategy_class.__name__, params, "streaming matches batch")
+
+
+# The `test_downloader` function downloads daily klines of many symbols from a local
+# mock Binance server, one by one and with `download_klines`, and checks that both
+# give the same klines and that the server never rejects a request for weight
+def test_downloader(n_symbols=60, weight_limit=1200, window=5.0, latency=0.05, max_workers=8):
+
+    end_datetime = datetime.utcnow()
+    jobs = [
+        (
+            f"S{i}USDT",
+            {
+                "start_datetime": end_datetime - timedelta(days=15),
+                "end_datetime": end_datetime,
+                "symbol": f"S{i}USDT",
+                "interval": "1d",
+            },
+        )
+        for i in range(n_symbols)
+    ]
+
+    with MockBinanceServer(weight_limit=weight_limit, window=window, latency=latency) as server:
+        client = make_client(server)
+
+        start = time.perf_counter()
+        bucket = TokenBucket(weight_limit=weight_limit, window=window)
+        expected = {key: fetch_kline(client, bucket, kwargs) for key, kwargs in jobs}
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bucket = TokenBucket(weight_limit=weight_limit, window=window)
+        results = dict(
+            download_klines(jobs, client=client, max_workers=max_workers, bucket=bucket)
+        )
+        concurrent_time = time.perf_counter() - start
+
+    assert results.keys() == expected.keys()
+    for key, df in expected.items():
+        pd.testing.assert_frame_equal(results[key], df)
+    assert server.n_rejected == 0
+
+    print(f"sequential: {n_symbols / sequential_time:.1f} symbols/s")
+    print(f"concurrent: {n_symbols / concurrent_time:.1f} symbols/s")
+    print(f"max weight used per window: {server.max_used_weight} of {weight_limit}")
+
+
+def test_stream(symbols=("BTCUSDT", "ETHUSDT"), n_bars=50, size=20):
+
+    # Closed bars are collected instead of written to the database, and the first
+    # write fails as if the database were locked
+    written = []
+    n_calls = [0]
+
+    def writer(bars):
+        n_calls[0] += 1
+        if n_calls[0] == 1:
+            raise sqlite3.OperationalError("database is locked")
+        written.extend(bars)
+        return len(bars)
+
+    # A malformed message in the middle of the recording is skipped
+    messages = make_stream_messages(list(symbols), n_bars=n_bars)
+    messages.insert(len(messages) // 2, "{not json")
+    with ReplayWebSocketServer(messages) as server:
+        with KlineStream(
+            symbols, size=size, url=server.url, flush_size=10, writer=writer
+        ) as stream:
+            while server.n_sent < len(messages):
+                time.sleep(0.05)
+            # Give the last messages time to be handled
+            time.sleep(0.2)
+
+    for symbol in symbols:
+        buffer = stream.buffers[symbol]
+        view = buffer.view()
+        df = buffer.to_frame()
+        # The buffer holds the last bars in order, as read-only views
+        assert df.shape[0] == size and df["dateTime"].is_monotonic_increasing
+        assert not view["close"].flags.writeable and view["close"].base is not None
+        assert stream.prices[symbol] == view["close"][-1]
+        print(f"{symbol}: last price {stream.prices[symbol]}")
+        print(df.tail())
+
+    assert stream.n_written == len(written) == n_bars * len(symbols)
+    print(f"{stream.n_written} closed bars written")
+
+    # While the database keeps failing, only the last max_pending bars are kept
+    def failing_writer(bars):
+        raise sqlite3.OperationalError("database is locked")
+
+    with ReplayWebSocketServer(messages) as server:
+        with KlineStream(
+            symbols, size=size, url=server.url, writer=failing_writer, max_pending=size
+        ) as stream:
+            while server.n_sent < len(messages):
+                time.sleep(0.05)
+            time.sleep(0.2)
+
+    assert stream.n_written == 0 and len(stream._pending) == size
+    assert stream.n_dropped == n_bars * len(symbols) - size
+    print(f"{stream.n_dropped} closed bars dropped")
+
+
+def test_replay_client(fixtures_dir="fixtures/test_replay", latency=0.2, n_calls=5):
+
+    kwargs = {
+        "start_datetime": datetime(2023, 1, 1),
+        "end_datetime": datetime(2023, 3, 1),
+        "symbol": "BTCUSDT",
+        "interval": "1d",
+    }
+
+    # Record the klines of a mock server, then serve them without it
+    with MockBinanceServer() as server:
+        client = RecordingClient(make_client(server), fixtures_dir)
+        expected = get_kline(client=client, **kwargs)
+
+    client = ReplayClient(fixtures_dir, latency=latency)
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        df = get_kline(client=client, **kwargs)
+    elapsed = (time.perf_counter() - start) / n_calls
+
+    pd.testing.assert_frame_equal(df, expected)
+    assert elapsed >= latency
+    print(f"replayed {df.shape[0]} klines in {elapsed:.3f} s per call")
+
+
+# The `test_replay_insert_klines_1d` function runs `exec/insert_klines_1d.py` against
+# the mock server while recording, then replays it a moment later on a copy of the
+# empty database and checks that the same klines are written without the server
+def test_replay_insert_klines_1d(
+    work_dir="fixtures/test_replay_insert", symbols=("BTCUSDT", "ETHUSDT", "BNBUSDT")
+):
+
+    from exec import create, insert_klines_1d
+    import trading_tool.configloader as cfg
+
+    os.makedirs(work_dir, exist_ok=True)
+    fixtures_dir = os.path.join(work_dir, "fixtures")
+    db_files = [os.path.join(work_dir, name) for name in ("record.db", "replay.db")]
+    db_filename = cfg.DB_FILENAME
+
+    try:
+        # Two empty databases with the same symbols
+        for db_file in db_files:
+            if os.path.exists(db_file):
+                os.remove(db_file)
+            cfg.DB_FILENAME = db_file
+            create.main()
+            conn = sqlite3.connect(db_file)
+            with conn:
+                conn.executemany(
+                    "INSERT INTO assets (asset) VALUES (?)",
+                    [(symbol[: -len("USDT")],) for symbol in symbols] + [("USDT",)],
+                )
+                conn.executemany(
+                    """
+                    INSERT INTO symbols (symbol, id_baseAsset, id_quoteAsset)
+                    VALUES (?, ?, (SELECT id FROM assets WHERE asset = 'USDT'))
+                    """,
+                    [(symbol, i + 1) for i, symbol in enumerate(symbols)],
+                )
+            conn.close()
+
+        with MockBinanceServer() as server:
+            cfg.DB_FILENAME = db_files[0]
+            insert_klines_1d.main(client=RecordingClient(make_client(server), fixtures_dir))
+
+        # Kline requests end at the current time, which has changed when replaying
+        time.sleep(1)
+        cfg.DB_FILENAME = db_files[1]
+        insert_klines_1d.main(client=ReplayClient(fixtures_dir))
+    finally:
+        cfg.DB_FILENAME = db_filename
+
+    recorded, replayed = [
+        pd.read_sql(
+            "SELECT id_symbol, dateTime, close FROM klines_1d ORDER BY id_symbol, dateTime",
+            sqlite3.connect(db_file),
+        )
+        for db_file in db_files
+    ]
+    assert recorded.shape[0] > 0
+    pd.testing.assert_frame_equal(replayed, recorded)
+    print(f"replayed insert_klines_1d wrote the {recorded.shape[0]} recorded klines")
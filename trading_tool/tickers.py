@@ -0,0 +1,155 @@
+import threading
+import time
+
+# Seconds a ticker snapshot is served before it is downloaded again, and seconds
+# between refreshes of the background thread
+TICKERS_TTL = 10
+TICKERS_REFRESH_INTERVAL = 5
+
+# Ticker services of the clients used in this process
+_SERVICES = {}
+_SERVICES_LOCK = threading.Lock()
+
+
+class TickerSnapshot:
+    """
+    Last prices of every symbol, downloaded with a single get_all_tickers call.
+
+    ...
+
+    Attributes
+    ----------
+    tickers : dict
+        last price of every symbol
+    prices : dict
+        last USDT price of every asset with a USDT symbol, and 1 for USDT. Only
+        symbols ending with USDT are quoted in USDT, so e.g. USDTTRY is not
+        taken as the price of TRY
+    fetched_at : float
+        monotonic time the tickers were downloaded
+    """
+
+    def __init__(self, tickers, fetched_at):
+        self.tickers = tickers
+        self.prices = {
+            symbol[: -len("USDT")]: price
+            for symbol, price in tickers.items()
+            if symbol.endswith("USDT") and symbol != "USDT"
+        }
+        self.prices["USDT"] = 1.0
+        self.fetched_at = fetched_at
+
+    @classmethod
+    def from_client(cls, client):
+        tickers = {
+            ticker["symbol"]: float(ticker["price"]) for ticker in client.get_all_tickers()
+        }
+        return cls(tickers, time.monotonic())
+
+    def age(self):
+        # Seconds since the tickers were downloaded
+        return time.monotonic() - self.fetched_at
+
+
+class TickerService:
+    """
+    Process-wide ticker snapshot of a client. The snapshot is downloaded again
+    when it is older than the TTL, or kept fresh by a background thread so that
+    readers never wait for the API.
+
+    ...
+
+    Attributes
+    ----------
+    client : Client
+        Binance API client
+    ttl : float
+        seconds a snapshot is served before it is downloaded again
+    snapshot : TickerSnapshot
+        last snapshot, None until the first download
+    """
+
+    def __init__(self, client, ttl=TICKERS_TTL):
+        self.client = client
+        self.ttl = ttl
+        self.snapshot = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def refresh(self):
+        # Download a new snapshot; readers keep the previous one until it is swapped
+        snapshot = TickerSnapshot.from_client(self.client)
+        self.snapshot = snapshot
+        return snapshot
+
+    def get(self):
+        """
+        Get the current snapshot, downloading it if it is missing or too old
+        :return: TickerSnapshot
+        """
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.age() < self.ttl:
+            return snapshot
+
+        # The lock makes concurrent readers share a single download
+        with self._lock:
+            snapshot = self.snapshot
+            if snapshot is None or snapshot.age() >= self.ttl:
+                snapshot = self.refresh()
+
+        return snapshot
+
+    def start(self, interval=TICKERS_REFRESH_INTERVAL):
+        """
+        Refresh the snapshot every interval seconds on a background thread
+        :param interval: seconds between refreshes, shorter than the TTL so that
+            readers do not download the snapshot themselves
+        :return: the service
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, interval):
+        while not self._stopped.is_set():
+            try:
+                with self._lock:
+                    self.refresh()
+            except Exception as exc:
+                # Keep serving the last snapshot; readers refresh it once it expires
+                print(f"Failed to refresh tickers: {exc}")
+            self._stopped.wait(interval)
+
+
+def get_ticker_service(client):
+    """
+    Get the ticker service of a client, shared by the whole process
+    :param client: Binance API client
+    :return: TickerService
+    """
+
+    with _SERVICES_LOCK:
+        service = _SERVICES.get(client)
+        if service is None:
+            service = _SERVICES[client] = TickerService(client)
+
+    return service
+
+
+def get_ticker_snapshot(client):
+    """
+    Get the current ticker snapshot of a client
+    :param client: Binance API client
+    :return: TickerSnapshot
+    """
+
+    return get_ticker_service(client).get()
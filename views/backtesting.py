@@ -1,20 +1,32 @@
 from datetime import datetime, date, timedelta
 import copy
 
-import pandas as pd
 from dash import html, dcc, Input, Output
 import plotly.graph_objects as go
 
 from trading_tool.client import CLIENT
-from trading_tool.db import get_db_klines_1d, CONN, get_coin_names_from_symbol, from_usdt
+from trading_tool.db import (
+    get_db_symbols,
+    get_connection,
+    get_coin_names_from_symbol,
+    get_klines_1m,
+    from_usdt,
+)
 from trading_tool.load import get_kline
 from trading_tool.strategy import SimpleStrategy, DummyStrategy, Wallet, MovingAverageStrategy
+from trading_tool.cache import MovingAverageCache
 from trading_tool.constants import (
     MIN_DATE_ALLOWED,
     MAX_DATE_ALLOWED,
     INITIAL_VISIBLE_MONTH,
     PRECISION,
     INITIAL_AMOUNT_USDT,
+    BIG_MA_MIN,
+    BIG_MA_MAX,
+    BIG_MA_STEP,
+    SMALL_MA_MIN,
+    SMALL_MA_MAX,
+    SMALL_MA_STEP,
 )
 from maindash import app
 from views.components import (
@@ -28,18 +40,13 @@ from views.plot import render_analytics_plot
 from views.style import colors, LIGHT_GREEN, ORANGE, format_number, format_percentage
 
 
-def make_backtesting_container_1():
+# Cumulative sums of the last klines requested, for the moving averages of the sliders
+MA_CACHE = MovingAverageCache()
 
-    df_symbols = pd.read_sql(
-        con=CONN,
-        sql="""
-        SELECT DISTINCT symbol AS symbol FROM symbols
-        INNER JOIN klines_1d 
-            ON klines_1d.id_symbol = symbols.id
-        """,
-    )
 
-    symbols = df_symbols["symbol"].to_list()
+def make_backtesting_container_1():
+
+    symbols = get_db_symbols(get_connection(readonly=True))
 
     symbols_dropdown = dcc.Dropdown(value="BTCUSDT", options=symbols, id="symbols")
     date_picker_range = dcc.DatePickerRange(
@@ -111,10 +118,10 @@ def make_backtesting_container_2():
         title_text="Big Moving Average",
         class_title="medium-font",
         element=dcc.Slider(
-            50,
-            500,
+            BIG_MA_MIN,
+            BIG_MA_MAX,
             value=100,
-            step=10,
+            step=BIG_MA_STEP,
             id="big-ma-selector",
             className="slider",
             marks=None,
@@ -126,10 +133,10 @@ def make_backtesting_container_2():
         title_text="Small Moving Average",
         class_title="medium-font",
         element=dcc.Slider(
-            0,
-            50,
+            SMALL_MA_MIN,
+            SMALL_MA_MAX,
             value=20,
-            step=1,
+            step=SMALL_MA_STEP,
             id="small-ma-selector",
             className="slider",
             marks=None,
@@ -506,19 +513,23 @@ def get_analytics_candle_plot(
     if time_diff.seconds // 60 < 60:
         start_datetime = start_datetime - timedelta(minutes=180)
 
-    df = get_kline(
-        client=CLIENT,
+    # read from the local klines store, the exchange is only queried for missing ranges
+    df = get_klines_1m(
+        symbol=symbol,
         start_datetime=pre_start_datetime,
         end_datetime=end_datetime,
-        symbol=symbol,
-        interval=CLIENT.KLINE_INTERVAL_1MINUTE,
     )
 
     big_ma_name = "avg_" + str(big_ma_selector)
     small_ma_name = "avg_" + str(small_ma_selector)
 
-    df[big_ma_name] = df["close"].rolling(big_ma_selector).mean()
-    df[small_ma_name] = df["close"].rolling(small_ma_selector).mean()
+    # moving averages of every slider window come from one cumulative sum per kline range
+    ma_cube = MA_CACHE.get(
+        key=(symbol, CLIENT.KLINE_INTERVAL_1MINUTE, pre_start_datetime, end_datetime),
+        values=df["close"].to_numpy(),
+    )
+    df[big_ma_name] = ma_cube.get(big_ma_selector)
+    df[small_ma_name] = ma_cube.get(small_ma_selector)
     df["big_ma"] = df[big_ma_name]
     df["small_ma"] = df[small_ma_name]
     df.dropna(inplace=True)
@@ -583,18 +594,20 @@ def get_analytics_candle_plot(
     end_wallet = strategy.end_wallet
     end_wallet_total = end_wallet.get_value_usdt(time=df["ds"].iloc[-1])
 
-    n_operations = strategy.get_n_operations()
-    n_good_operations = strategy.get_n_good_operations()
-    n_bad_operations = strategy.get_n_bad_operations()
-    n_operations_by_hour = strategy.get_n_operations_by_hour()
-    mean_operation_time = strategy.get_mean_operation_time()
-    profitabilities = strategy.get_profitabilities()
+    # all metrics are computed in a single pass
+    metrics = strategy.get_metrics()
+    n_operations = metrics.n_operations
+    n_good_operations = metrics.n_good_operations
+    n_bad_operations = metrics.n_bad_operations
+    n_operations_by_hour = metrics.n_operations_by_hour
+    mean_operation_time = metrics.mean_operation_time
+    profitabilities = metrics.profitabilities
     interval_profitability = profitabilities["interval"]
     if interval_profitability > 0:
         interval_profitability_style = {"color": "green"}
     else:
         interval_profitability_style = {"color": "red"}
-    market_profitability = dummy_strategy.get_profitabilities()["interval"]
+    market_profitability = dummy_strategy.get_metrics().profitabilities["interval"]
     mean_profitability = profitabilities["mean"]
     daily_profitability = profitabilities["day"]
     weekly_profitability = profitabilities["week"]
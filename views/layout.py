@@ -1,6 +1,5 @@
 from dash import html, dcc
 
-from trading_tool.db import create_connection
 from trading_tool.client import TEST_CLIENT
 from views.header import make_header
 from views.backtesting import make_backtesting_container_1, make_backtesting_container_2
@@ -8,9 +7,6 @@ from views.profile import make_profile_description
 from views.footer import make_footer
 
 
-conn = create_connection("trading_tool.db")
-
-
 def make_layout():
 
     overview_tab = dcc.Tab(
@@ -1,13 +1,15 @@
 from dash import html, dcc, dash_table
 import plotly.express as px
 from trading_tool.load import get_portfolio
+from trading_tool.db import get_spot_prices
 from views.style import colors, table_colors, GRAY5
 
 
 def make_profile_description(client):
 
-    # get current portfolio in usdt
-    df = get_portfolio(client)
+    # get current portfolio in usdt, valuing assets without a USDT symbol through
+    # their conversion path
+    df = get_portfolio(client, prices=get_spot_prices(client))
 
     # create pie chart with plotly
     fig = px.pie(